@@ -0,0 +1,177 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ==========================================
+# ENV VARIABLES
+# ==========================================
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+_PUNCTUATION = re.compile(r"[^\w\s$.]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    text = _PUNCTUATION.sub(" ", (text or "").lower())
+    return _SPACES.sub(" ", text).strip(" .")
+
+
+def context_key(context: str, scope: str = "", history=None) -> str:
+    if scope:
+        context = f"{scope}\n{context or ''}"
+    if history:
+        # Follow-ups ("what about the screen?") depend on the conversation so far
+        context = json.dumps(history, sort_keys=True) + "\n" + (context or "")
+    return hashlib.sha1((context or "").encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    LRU + TTL cache of LLM replies keyed on (normalized question, retrieved
+    context, the earlier messages the prompt carries, store scope).
+
+    Exact matches are a dict lookup. When a query vector is supplied, questions
+    that retrieved the same context and are at least `similarity` cosine-close
+    to a cached question are served too ("how much is an iphone 13 screen" vs
+    "iphone 13 screen price"). `scope` keeps stores that retrieve the same
+    context from sharing replies.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, similarity=ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()
+        self._by_context = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # ---------------- internals ----------------
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_context.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                self._by_context.pop(key[1], None)
+
+    def _fresh(self, entry, now):
+        return now - entry["created_at"] <= self.ttl
+
+    @staticmethod
+    def _unit(vector):
+        if vector is None:
+            return None
+        vector = np.asarray(vector, dtype="float32")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    # ---------------- public API ----------------
+    def get(self, question: str, context: str, vector=None, scope: str = "", history=None):
+        key = (normalize_question(question), context_key(context, scope, history), scope)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                if self._fresh(entry, now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry["reply"]
+                self._drop(key)
+
+            query = self._unit(vector)
+
+            if query is not None:
+                best_key, best_score = None, self.similarity
+
+                for candidate in list(self._by_context.get(key[1], ())):
+                    cached = self._entries[candidate]
+
+                    if not self._fresh(cached, now):
+                        self._drop(candidate)
+                        continue
+
+                    if cached["vector"] is None:
+                        continue
+
+                    score = float(np.dot(query, cached["vector"]))
+                    if score >= best_score:
+                        best_key, best_score = candidate, score
+
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return self._entries[best_key]["reply"]
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, context: str, reply: str, vector=None, scope: str = "", history=None):
+        if not reply:
+            return
+
+        key = (normalize_question(question), context_key(context, scope, history), scope)
+
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = {
+                "reply": reply,
+                "vector": self._unit(vector),
+                "created_at": time.monotonic(),
+            }
+            self._by_context.setdefault(key[1], set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, reason: str = "", scope: str = None):
+        """
+        Drop every entry, or only those cached under `scope` (one store).
+        """
+        with self._lock:
+            if scope is None:
+                self._entries.clear()
+                self._by_context.clear()
+            else:
+                for key in [key for key in self._entries if key[2] == scope]:
+                    self._drop(key)
+            self.invalidations += 1
+
+        print(f"🧹 Answer cache cleared ({reason or 'manual'})")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+answer_cache = AnswerCache()
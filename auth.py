@@ -1,35 +1,164 @@
 import os
+import json
+import time
+import base64
+import asyncio
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def get_auth_token():
-    BASE_URL = os.getenv("API_BASE_URL")
+AUTH_TIMEOUT = float(os.getenv("AUTH_TIMEOUT", "10"))
+# Refresh this many seconds before the access token's `exp`
+AUTH_REFRESH_MARGIN = float(os.getenv("AUTH_REFRESH_MARGIN", "60"))
+# Used when the token is not a JWT or carries no `exp`
+AUTH_DEFAULT_TTL = float(os.getenv("AUTH_DEFAULT_TTL", "300"))
+BACKEND_POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "20"))
+
+# ==========================================
+# POOLED HTTP SESSIONS (shared by all backend calls)
+# ==========================================
+_session = None
+_session_lock = threading.Lock()
+_async_client = None
+
+
+def get_session() -> requests.Session:
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=BACKEND_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+
+    return _session
+
+
+def get_async_client():
+    global _async_client
+
+    import httpx
 
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            timeout=AUTH_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=BACKEND_POOL_SIZE,
+                max_keepalive_connections=BACKEND_POOL_SIZE,
+            ),
+        )
+
+    return _async_client
+
+
+async def aclose():
+    global _async_client
+
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+# ==========================================
+# TOKEN MANAGER
+# ==========================================
+def _token_expiry(token: str) -> float:
+    """
+    Read `exp` from a JWT without verifying it; fall back to AUTH_DEFAULT_TTL.
+    """
     try:
-        login_url = f"{BASE_URL}/auth/login/"
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        if exp:
+            return float(exp)
+    except Exception:
+        pass
+
+    return time.time() + AUTH_DEFAULT_TTL
+
 
-        response = requests.post(
-            login_url,
+class TokenManager:
+    """
+    Caches the backend access token and logs in again shortly before it
+    expires. Concurrent refreshes (threads or coroutines) share one login.
+    """
+
+    def __init__(self):
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_task = None
+        self.logins = 0
+
+    def _fresh(self) -> bool:
+        return self._token is not None and time.time() < self._expires_at - AUTH_REFRESH_MARGIN
+
+    def _login(self):
+        base_url = os.getenv("API_BASE_URL")
+
+        response = get_session().post(
+            f"{base_url}/auth/login/",
             json={
                 "email": os.getenv("ADMIN_EMAIL"),
                 "password": os.getenv("ADMIN_PASSWORD")
-            }
+            },
+            timeout=AUTH_TIMEOUT,
         )
 
         response.raise_for_status()
         data = response.json()
 
-        # 🔥 FIXED HERE
         auth_token = data.get("tokens", {}).get("access")
-        print(auth_token)
-        
+
         if not auth_token:
             raise ValueError("Access token not found in response")
-    
+
+        self._token = auth_token
+        self._expires_at = _token_expiry(auth_token)
+        self.logins += 1
+        print(f"🔑 Logged in, token valid for {int(self._expires_at - time.time())}s")
+
         return auth_token
 
-    except Exception as e:
-        print("❌ Auth error:", e)
-        return None
+    def get_token(self, force_refresh: bool = False):
+        if not force_refresh and self._fresh():
+            return self._token
+
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            if not force_refresh and self._fresh():
+                return self._token
+
+            try:
+                return self._login()
+            except Exception as e:
+                print("❌ Auth error:", e)
+                return None
+
+    async def aget_token(self, force_refresh: bool = False):
+        if not force_refresh and self._fresh():
+            return self._token
+
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(
+                asyncio.to_thread(self.get_token, force_refresh)
+            )
+
+        return await asyncio.shield(self._refresh_task)
+
+    def invalidate(self):
+        self._expires_at = 0.0
+
+
+token_manager = TokenManager()
+
+
+def get_auth_token():
+    return token_manager.get_token()
@@ -0,0 +1,249 @@
+import os
+import pytz
+from datetime import datetime
+from dataclasses import dataclass
+from xml.sax.saxutils import escape
+from twilio.twiml.voice_response import VoiceResponse, Gather, Connect
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ==========================================
+# ENV VARIABLES
+# ==========================================
+STORE_NAME = os.getenv("STORE_NAME")
+PUBLIC_URL = os.getenv("PUBLIC_URL")
+STORE_TIMEZONE = os.getenv("STORE_TIMEZONE", "America/New_York")
+# Off by default: calls have always been answered around the clock
+BUSINESS_HOURS_ENFORCED = os.getenv("BUSINESS_HOURS_ENFORCED", "false").lower() == "true"
+
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+SORRY_MESSAGE = "Sorry, I didn't catch that. Could you repeat?"
+TRANSFER_MESSAGE = "Connecting you to a human agent."
+BOOKING_MESSAGE = "Thank you! I have sent the appointment link."
+INITIALIZING_MESSAGE = "System is initializing. Please try again shortly."
+
+_REPLY_SLOT = "__REPLY__"
+
+
+# ==========================================
+# BUSINESS HOURS
+# ==========================================
+def _minutes(value) -> int:
+    hours, minutes = (str(value).split(":") + ["0"])[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def compile_hours(business_hours) -> tuple:
+    """
+    Per-weekday (Monday = 0) tuples of (open_minute, close_minute) intervals.
+    A close at or before the open runs past midnight into the next day.
+    """
+    table = [[] for _ in DAY_NAMES]
+
+    for day_config in business_hours or []:
+        day = day_config.get("day")
+
+        if day not in range(7) or not day_config.get("is_open"):
+            continue
+
+        try:
+            start = _minutes(day_config["open_time"])
+            end = _minutes(day_config["close_time"])
+        except (KeyError, ValueError):
+            print(f"⚠ Bad business hours for day {day}: {day_config}")
+            continue
+
+        if end > start:
+            table[day].append((start, end))
+        else:
+            table[day].append((start, 24 * 60))
+            if end > 0:
+                table[(day + 1) % 7].append((0, end))
+
+    return tuple(tuple(sorted(intervals)) for intervals in table)
+
+
+def format_hours(business_hours) -> str:
+    formatted_hours = []
+
+    for day_config in business_hours or []:
+        day_number = day_config.get("day")
+        day_name = DAY_NAMES[day_number] if day_number in range(7) else f"Day {day_number}"
+
+        if not day_config.get("is_open"):
+            formatted_hours.append(f"{day_name}: Closed")
+        else:
+            open_time = day_config.get("open_time", "")[:5]
+            close_time = day_config.get("close_time", "")[:5]
+            formatted_hours.append(f"{day_name}: {open_time} - {close_time}")
+
+    return "\n".join(formatted_hours)
+
+
+# ==========================================
+# TWIML
+# ==========================================
+def _gather():
+    return Gather(
+        input="speech",
+        action=f"{PUBLIC_URL}/voice",
+        method="POST",
+        timeout=15,
+        speechTimeout="auto",
+        language="en-US",
+        speechModel="phone_call"
+    )
+
+
+def _listen(text: str) -> bytes:
+    response = VoiceResponse()
+    response.pause(length=1)
+    response.say(text, voice="alice", language="en-US")
+    response.append(_gather())
+    # fallback if user silent
+    response.say(SORRY_MESSAGE, voice="alice")
+    response.redirect(f"{PUBLIC_URL}/voice")
+    return str(response).encode("utf-8")
+
+
+def _say_and_hangup(text: str) -> bytes:
+    response = VoiceResponse()
+    response.say(text, voice="alice")
+    response.hangup()
+    return str(response).encode("utf-8")
+
+
+def _transfer(manager_number: str) -> bytes:
+    response = VoiceResponse()
+    response.say(TRANSFER_MESSAGE, voice="alice")
+    response.dial(manager_number, timeout=20)
+    return str(response).encode("utf-8")
+
+
+def _say(text: str) -> bytes:
+    response = VoiceResponse()
+    response.say(text, voice="alice")
+    return str(response).encode("utf-8")
+
+
+CALL_ERROR_TWIML = _say("Call error occurred.")
+SERVER_ERROR_TWIML = _say_and_hangup("Sorry. There was a server error.")
+INITIALIZING_TWIML = _say_and_hangup(INITIALIZING_MESSAGE)
+
+
+def stream_ws_url() -> str:
+    public_url = PUBLIC_URL or ""
+    if public_url.startswith("https://"):
+        return "wss://" + public_url[len("https://"):] + "/stream"
+    if public_url.startswith("http://"):
+        return "ws://" + public_url[len("http://"):] + "/stream"
+    return public_url + "/stream"
+
+
+def _relay(greeting: str) -> bytes:
+    response = VoiceResponse()
+    connect = Connect(action=f"{PUBLIC_URL}/stream-action", method="POST")
+    connect.conversation_relay(
+        url=stream_ws_url(),
+        welcome_greeting=greeting,
+        language="en-US",
+        interruptible="speech",
+    )
+    response.append(connect)
+    return str(response).encode("utf-8")
+
+
+# ==========================================
+# SNAPSHOT
+# ==========================================
+@dataclass(frozen=True)
+class BehaviorSnapshot:
+    """
+    Everything a turn needs from the AI behavior, computed once per load.
+    Replace the whole snapshot to update; never mutate one in place.
+    """
+    data: dict
+    timezone: object
+    hours: tuple
+    hours_text: str
+    tone: str
+    greeting: str
+    closed_message: str
+    closing_message: str
+    system_prompt: str
+    greeting_twiml: bytes
+    closed_twiml: bytes
+    closing_twiml: bytes
+    transfer_twiml: bytes
+    booking_twiml: bytes
+    initializing_twiml: bytes
+    stream_twiml: bytes
+    reply_head: bytes
+    reply_tail: bytes
+
+    def __bool__(self):
+        return bool(self.data)
+
+    def is_open(self, now=None) -> bool:
+        if not BUSINESS_HOURS_ENFORCED:
+            return True
+
+        now = now or datetime.now(self.timezone)
+        minute = now.hour * 60 + now.minute
+
+        return any(start <= minute < end for start, end in self.hours[now.weekday()])
+
+    def reply_twiml(self, reply: str) -> bytes:
+        return self.reply_head + escape(reply).encode("utf-8") + self.reply_tail
+
+
+def compile_behavior(data: dict = None, manager_number: str = None, store_name: str = None) -> BehaviorSnapshot:
+    data = data or {}
+    store_name = store_name or STORE_NAME
+    greetings = data.get("greetings") or {}
+    tone = data.get("tone", "friendly")
+
+    try:
+        timezone = pytz.timezone(data.get("timezone") or STORE_TIMEZONE)
+    except pytz.UnknownTimeZoneError:
+        print(f"⚠ Unknown store timezone {data.get('timezone')!r}, using {STORE_TIMEZONE}")
+        timezone = pytz.timezone(STORE_TIMEZONE)
+
+    greeting = greetings.get("opening_hours_greeting", "").replace("{store_name}", store_name or "")
+    closed_message = greetings.get("closed_hours_message", "We are closed.")
+    closing_message = f"Thank you for calling {store_name}. Have a great day."
+
+    system_prompt = f"""
+You are a retail call assistant for {store_name}.
+Tone: {tone}
+
+Rules:
+- Answer ONLY from retrieved knowledge.
+- Keep responses short and voice-friendly.
+- If unsure, ask again.
+"""
+
+    reply_head, reply_tail = _listen(_REPLY_SLOT).split(_REPLY_SLOT.encode("utf-8"))
+
+    return BehaviorSnapshot(
+        data=data,
+        timezone=timezone,
+        hours=compile_hours(data.get("business_hours")),
+        hours_text=format_hours(data.get("business_hours")),
+        tone=tone,
+        greeting=greeting,
+        closed_message=closed_message,
+        closing_message=closing_message,
+        system_prompt=system_prompt,
+        greeting_twiml=_listen(greeting),
+        closed_twiml=_say_and_hangup(closed_message),
+        closing_twiml=_say_and_hangup(closing_message),
+        transfer_twiml=_transfer(manager_number) if manager_number else None,
+        booking_twiml=_say_and_hangup(BOOKING_MESSAGE),
+        initializing_twiml=INITIALIZING_TWIML,
+        stream_twiml=_relay(greeting),
+        reply_head=reply_head,
+        reply_tail=reply_tail,
+    )
@@ -0,0 +1,370 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+import numpy as np
+import faiss
+
+# ==========================================
+# RETRIEVAL BENCHMARK
+# ==========================================
+# Builds the pricing index with rag.py's own code (rows_to_documents ->
+# vectorstore_from_vectors -> save/load_vectorstore -> similarity k=3)
+# over synthetic price lists of growing size, then times and scores
+# retrieval for each RAG_INDEX_TYPE.
+# Everything is offline and deterministic: rows come from a seeded
+# generator and vectors from a hashing embedder, so two runs of the same
+# commit on the same box are directly comparable. --embeddings onnx times
+# the local ONNX model from ONNX_MODEL_PATH instead.
+#
+#   python bench_rag.py --sizes 500,5000,50000 --json results.json
+#   python bench_rag.py --baseline results.json     # exit 1 on regression
+
+from intents import REPAIR_TYPES
+from embeddings import HashingEmbeddings, OnnxEmbeddings
+import embeddings
+import rag
+from rag import rows_to_documents
+
+DEFAULT_SIZES = "500,5000,50000"
+DEFAULT_INDEXES = ",".join(rag.INDEX_TYPES)
+EMBEDDING_DIM = 384
+
+STORES = ["Downtown", "Eastside", "Mall", "Airport", "Harbor", "Uptown", "Westfield", "Riverside"]
+
+# brand -> (category, model names)
+CATALOG = {
+    "Apple": ("Phone", [
+        f"iPhone {n}{suffix}"
+        for n in ["8", "X", "XR", "XS", "11", "12", "13", "14", "15", "16"]
+        for suffix in ["", " Pro", " Pro Max", " Plus", " mini"]
+    ]),
+    "Apple iPad": ("Tablet", [f"iPad {gen}th Gen" for gen in range(5, 11)] + [
+        f"iPad {line} {size}" for line in ["Air", "Pro", "mini"] for size in ["11", "12.9", "8.3"]
+    ]),
+    "Samsung": ("Phone", [
+        f"Galaxy S{n}{suffix}" for n in range(8, 25) for suffix in ["", "+", " Ultra", " FE"]
+    ] + [f"Galaxy A{n}" for n in range(10, 75, 2)] + [f"Galaxy Note {n}" for n in range(8, 21)] + [
+        f"Galaxy Z {kind} {n}" for kind in ["Fold", "Flip"] for n in range(3, 7)
+    ]),
+    "Google": ("Phone", [
+        f"Pixel {n}{suffix}" for n in range(3, 10) for suffix in ["", " XL", "a", " Pro"]
+    ]),
+    "Motorola": ("Phone", [f"Moto G{n}" for n in range(7, 80, 3)] + [f"Edge {year}" for year in range(2020, 2026)]),
+    "OnePlus": ("Phone", [f"OnePlus {n}{suffix}" for n in range(7, 13) for suffix in ["", " Pro", "T"]]),
+    "Nintendo": ("Console", ["Switch", "Switch Lite", "Switch OLED"]),
+    "Sony": ("Console", ["PlayStation 4", "PlayStation 4 Pro", "PlayStation 5", "PlayStation 5 Digital"]),
+    "Microsoft": ("Console", ["Xbox One", "Xbox One S", "Xbox One X", "Xbox Series S", "Xbox Series X"]),
+}
+
+QUERY_TEMPLATES = [
+    "How much is a {repair} repair for the {brand} {model}?",
+    "what do you charge to fix the {repair} on my {model}",
+    "{brand} {model} {repair} price",
+    "Hi, I need a {repair} for a {model}, how much?",
+]
+
+
+# ==========================================
+# SYNTHETIC CATALOG
+# ==========================================
+def synthetic_rows(count: int, seed: int = 42) -> list:
+    """
+    `count` price-list rows shaped like the price-list API returns them
+    (what fetch_pricing_rows() hands to rows_to_documents()). Every
+    (model, repair) pair is used once per store before the next store
+    starts, so large catalogs look like several stores' lists merged.
+    """
+    rng = random.Random(seed)
+    devices = [(brand, category, model) for brand, (category, models) in CATALOG.items() for model in models]
+    pairs = [(device, repair["name"]) for device in devices for repair in REPAIR_TYPES]
+    rng.shuffle(pairs)
+
+    rows = []
+    for i in range(count):
+        store_index, pair_index = divmod(i, len(pairs))
+        (brand, category, model), repair = pairs[pair_index]
+        store = STORES[store_index % len(STORES)]
+        if store_index >= len(STORES):
+            store = f"{store} {store_index // len(STORES) + 1}"
+
+        rows.append({
+            "id": i + 1,
+            "store_name": f"Fix-It {store}",
+            "brand_name": brand,
+            "device_model_name": model,
+            "repair_type_name": repair,
+            "category_name": category,
+            "price": rng.choice([29, 49, 79, 89.99, 99, 129, 149, 199, 249, 299]),
+        })
+
+    return rows
+
+
+def synthetic_queries(rows, count: int, seed: int = 7) -> list:
+    """
+    (utterance, relevant) pairs: a caller asking about one sampled row.
+    Any row with the same brand, model and repair is a correct answer.
+    """
+    rng = random.Random(seed)
+    queries = []
+
+    for row in rng.sample(rows, min(count, len(rows))):
+        template = rng.choice(QUERY_TEMPLATES)
+        brand = row["brand_name"].split()[0]
+        text = template.format(brand=brand, model=row["device_model_name"], repair=row["repair_type_name"])
+        queries.append((text, relevance_key(row)))
+
+    return queries
+
+
+def relevance_key(row) -> tuple:
+    return row["brand_name"], row["device_model_name"], row["repair_type_name"]
+
+
+# ==========================================
+# MEASUREMENT
+# ==========================================
+def percentile(values, pct):
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    # nearest-rank, like checker.py
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def exact_neighbors(vectors, query_vectors, k):
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    _, ids = index.search(np.asarray(query_vectors, dtype="float32"), k)
+    return ids
+
+
+def measure_load(vectorstore, embedder) -> dict:
+    """
+    Time rag.load_vectorstore() on a saved copy, read into RAM and memory-mapped.
+    """
+    times = {}
+
+    with tempfile.TemporaryDirectory() as path:
+        vectorstore.save_local(path)
+        threshold = rag.RAG_MMAP_MIN_MB
+
+        for mode, mmap in (("ram", False), ("mmap", True)):
+            rag.RAG_MMAP_MIN_MB = 0
+            started = time.perf_counter()
+            try:
+                rag.load_vectorstore(path, embedder, mmap=mmap)
+            finally:
+                rag.RAG_MMAP_MIN_MB = threshold
+            times[mode] = time.perf_counter() - started
+
+    return times
+
+
+def bench_index(kind, rows, documents, vectors, queries, query_vectors, truth, embedder, k) -> dict:
+    started = time.perf_counter()
+    vectorstore = rag.vectorstore_from_vectors(documents, vectors, embedder, kind)
+    build_seconds = time.perf_counter() - started
+
+    load_seconds = measure_load(vectorstore, embedder)
+
+    position = {doc_id: i for i, doc_id in vectorstore.index_to_docstore_id.items()}
+    keys = {str(row["id"]): relevance_key(row) for row in rows}
+
+    # Warm caches so the first queries don't skew the tail
+    for query_vector in query_vectors[:10]:
+        vectorstore.similarity_search_by_vector(query_vector, k=k)
+
+    embed_ms, search_ms = [], []
+    recall_hits, relevant_hits = 0, 0
+
+    for (text, relevant), expected in zip(queries, truth):
+        started = time.perf_counter()
+        query_vector = embedder.embed_query(text)
+        embedded = time.perf_counter()
+        docs = vectorstore.similarity_search_by_vector(query_vector, k=k)
+        searched = time.perf_counter()
+
+        embed_ms.append((embedded - started) * 1000)
+        search_ms.append((searched - embedded) * 1000)
+
+        found = [position[doc.metadata["row_id"]] for doc in docs]
+        recall_hits += len(set(found) & set(expected.tolist()))
+        relevant_hits += any(keys[doc.metadata["row_id"]] == relevant for doc in docs)
+
+    total_ms = [a + b for a, b in zip(embed_ms, search_ms)]
+
+    return {
+        "rows": len(rows),
+        "index": kind,
+        # what was actually built (ivfpq falls back to flat on tiny catalogs)
+        "built": rag.index_type(vectorstore.index),
+        "build_seconds": round(build_seconds, 3),
+        "load_seconds": round(load_seconds["ram"], 4),
+        "load_mmap_seconds": round(load_seconds["mmap"], 4),
+        "index_bytes": int(faiss.serialize_index(vectorstore.index).nbytes),
+        "queries": len(queries),
+        "embed_p50_ms": round(percentile(embed_ms, 50), 3),
+        "search_p50_ms": round(percentile(search_ms, 50), 3),
+        "search_p95_ms": round(percentile(search_ms, 95), 3),
+        "search_p99_ms": round(percentile(search_ms, 99), 3),
+        "total_p50_ms": round(percentile(total_ms, 50), 3),
+        "total_p95_ms": round(percentile(total_ms, 95), 3),
+        "total_p99_ms": round(percentile(total_ms, 99), 3),
+        "qps": round(len(total_ms) / (sum(total_ms) / 1000), 1) if sum(total_ms) else 0.0,
+        # overlap with exact top-k over the same vectors (index approximation loss)
+        f"recall_at_{k}": round(recall_hits / (len(queries) * k), 4),
+        # a row for the asked-about device + repair came back (end-to-end quality)
+        f"hit_at_{k}": round(relevant_hits / len(queries), 4),
+    }
+
+
+def run(args) -> dict:
+    embedder = OnnxEmbeddings() if args.embeddings == "onnx" else HashingEmbeddings(args.dim)
+    kinds = [kind.strip() for kind in args.indexes.split(",") if kind.strip()]
+    results = []
+
+    for size in [int(size) for size in args.sizes.split(",") if size.strip()]:
+        rows = synthetic_rows(size, args.seed)
+        documents = rows_to_documents(rows)
+
+        started = time.perf_counter()
+        vectors = embedder.embed_documents([doc.page_content for doc in documents])
+        embed_seconds = time.perf_counter() - started
+
+        queries = synthetic_queries(rows, args.queries, args.seed + 1)
+        query_vectors = [embedder.embed_query(text) for text, _ in queries]
+        truth = exact_neighbors(np.asarray(vectors, dtype="float32"), query_vectors, args.k)
+
+        print(f"📦 {size} rows embedded in {embed_seconds:.2f}s", file=sys.stderr)
+
+        for kind in kinds:
+            result = bench_index(kind, rows, documents, vectors, queries, query_vectors, truth, embedder, args.k)
+            result["embed_seconds"] = round(embed_seconds, 3)
+            results.append(result)
+            print(f"✅ {kind} at {size} rows: p95 {result['search_p95_ms']}ms", file=sys.stderr)
+
+    return {"meta": run_metadata(args), "results": results}
+
+
+def run_metadata(args) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "faiss": faiss.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "embeddings": embeddings.signature("onnx") if args.embeddings == "onnx" else f"hashing:{args.dim}",
+        "dim": args.dim,
+        "k": args.k,
+        "seed": args.seed,
+        "hnsw_m": rag.RAG_HNSW_M,
+        "hnsw_ef_search": rag.RAG_HNSW_EF_SEARCH,
+        "ivf_nlist": rag.RAG_IVF_NLIST or "auto",
+        "ivf_nprobe": rag.RAG_IVF_NPROBE,
+        "pq_m": rag.RAG_PQ_M or "auto",
+        "pq_bits": rag.RAG_PQ_BITS,
+    }
+
+
+# ==========================================
+# REPORTING
+# ==========================================
+def print_results(report: dict):
+    k = report["meta"]["k"]
+
+    print(
+        f"\n{'rows':>8} {'index':<11}{'build s':>9}{'load ms':>9}{'mmap ms':>9}{'size MB':>9}{'p50 ms':>9}"
+        f"{'p95 ms':>9}{'p99 ms':>9}{'qps':>9}{f'recall@{k}':>10}{f'hit@{k}':>8}"
+    )
+    for r in report["results"]:
+        # ivfpq on a catalog too small to train shows as ivfpq>flat
+        label = r["index"] if r["built"] == r["index"] else f"{r['index']}>{r['built']}"
+        print(
+            f"{r['rows']:>8} {label:<11}{r['build_seconds']:>9.2f}{r['load_seconds'] * 1000:>9.1f}"
+            f"{r['load_mmap_seconds'] * 1000:>9.1f}{r['index_bytes'] / 1e6:>9.1f}"
+            f"{r['search_p50_ms']:>9.3f}{r['search_p95_ms']:>9.3f}{r['search_p99_ms']:>9.3f}"
+            f"{r['qps']:>9.0f}{r[f'recall_at_{k}']:>10.3f}{r[f'hit_at_{k}']:>8.3f}"
+        )
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Regressions against a baseline report: p95 search latency more than
+    `tolerance` slower, or recall/hit rate down by more than a point.
+    """
+    k = report["meta"]["k"]
+    previous = {(r["rows"], r["index"]): r for r in baseline.get("results", [])}
+    problems = []
+
+    for r in report["results"]:
+        old = previous.get((r["rows"], r["index"]))
+        if old is None:
+            continue
+
+        label = f"{r['index']} at {r['rows']} rows"
+
+        if r["search_p95_ms"] > old["search_p95_ms"] * (1 + tolerance):
+            problems.append(f"{label}: p95 {old['search_p95_ms']}ms -> {r['search_p95_ms']}ms")
+
+        for metric in (f"recall_at_{k}", f"hit_at_{k}"):
+            if metric in old and r[metric] < old[metric] - 0.01:
+                problems.append(f"{label}: {metric} {old[metric]} -> {r[metric]}")
+
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pricing retrieval across catalog sizes and FAISS index types")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated row counts")
+    parser.add_argument("--indexes", default=DEFAULT_INDEXES, help=f"comma-separated, from {', '.join(rag.INDEX_TYPES)}")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3, help="neighbours per query (rag.py uses 3)")
+    parser.add_argument("--embeddings", choices=["hashing", "onnx"], default="hashing", help="local query/index embedder")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="hashing embedder size")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", metavar="PATH", help="write the report as JSON ('-' for stdout)")
+    parser.add_argument("--baseline", metavar="PATH", help="earlier --json report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown vs baseline")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    if args.json == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        print_results(report)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\n💾 Results written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            problems = compare(report, json.load(f), args.tolerance)
+
+        for problem in problems:
+            print(f"❌ Regression: {problem}", file=sys.stderr)
+
+        if problems:
+            sys.exit(1)
@@ -0,0 +1,216 @@
+import os
+import json
+import gzip
+import glob
+import time
+import queue
+import shutil
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: the in-process writer thread still serializes
+    fcntl = None
+
+load_dotenv()
+
+# ==========================================
+# ENV VARIABLES
+# ==========================================
+CALL_LOG_PATH = os.getenv("CALL_LOG_PATH", "calllog.jsonl")
+LEGACY_LOG_PATH = "calllog.json"
+CALL_LOG_MAX_BYTES = int(os.getenv("CALL_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+CALL_LOG_ROTATE_SECONDS = int(os.getenv("CALL_LOG_ROTATE_SECONDS", "86400"))
+CALL_LOG_BACKUPS = int(os.getenv("CALL_LOG_BACKUPS", "30"))
+CALL_LOG_COMPRESS = os.getenv("CALL_LOG_COMPRESS", "true").lower() == "true"
+
+
+def _segment_glob(path):
+    root, ext = os.path.splitext(path)
+    return f"{root}-*{ext}*"
+
+
+# ==========================================
+# WRITER
+# ==========================================
+class CallLogWriter:
+    """
+    Append-only JSON-lines call log.
+
+    One background thread owns the file, so concurrent calls only enqueue.
+    Each record is written with a single O_APPEND write under an flock, which
+    also keeps several worker processes from interleaving or racing a rotation.
+    """
+
+    def __init__(self, path=CALL_LOG_PATH, max_bytes=CALL_LOG_MAX_BYTES,
+                 rotate_seconds=CALL_LOG_ROTATE_SECONDS, backups=CALL_LOG_BACKUPS,
+                 compress=CALL_LOG_COMPRESS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+        self.compress = compress
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    # ---------------- public API ----------------
+    def write(self, record: dict):
+        """
+        Enqueue one record; never blocks on disk.
+        """
+        self._ensure_started()
+        self._queue.put(record)
+
+    def close(self, timeout=5):
+        if self._thread is None:
+            return
+
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # ---------------- internals ----------------
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="call-log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+
+            try:
+                self._append(record)
+            except Exception as e:
+                print("❌ Failed writing call log:", e)
+
+    def _append(self, record):
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        lock_fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o644)
+
+        try:
+            if fcntl:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+
+            rotated = self._rotate_if_needed(len(line))
+
+            fd = os.open(self.path, os.O_CREAT | os.O_WRONLY | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        finally:
+            if fcntl:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+
+        if rotated:
+            self._finish_segment(rotated)
+
+    def _rotate_if_needed(self, incoming):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+        if stat.st_size == 0:
+            return None
+
+        too_big = stat.st_size + incoming > self.max_bytes
+        too_old = (
+            self.rotate_seconds > 0
+            and int(stat.st_mtime // self.rotate_seconds) != int(time.time() // self.rotate_seconds)
+        )
+
+        if not (too_big or too_old):
+            return None
+
+        root, ext = os.path.splitext(self.path)
+        stamp = datetime.utcfromtimestamp(stat.st_mtime).strftime("%Y%m%dT%H%M%S")
+        suffix = 0
+        target = f"{root}-{stamp}-{suffix:03d}{ext}"
+
+        while os.path.exists(target) or os.path.exists(target + ".gz"):
+            suffix += 1
+            target = f"{root}-{stamp}-{suffix:03d}{ext}"
+
+        os.replace(self.path, target)
+        return target
+
+    def _finish_segment(self, segment):
+        if self.compress:
+            try:
+                with open(segment, "rb") as src, gzip.open(segment + ".gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(segment)
+            except Exception as e:
+                print("⚠ Failed compressing call log segment:", e)
+
+        segments = sorted(glob.glob(_segment_glob(self.path)))
+        for old in segments[:-self.backups] if self.backups > 0 else []:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+# ==========================================
+# READER
+# ==========================================
+def _read_jsonl(path):
+    opener = gzip.open if path.endswith(".gz") else open
+
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue  # torn last line after a crash
+
+
+def _read_legacy(path):
+    try:
+        with open(path, "r") as f:
+            loaded = json.load(f)
+    except (OSError, ValueError):
+        return []
+
+    if isinstance(loaded, dict):
+        return [loaded]
+    if isinstance(loaded, list):
+        return loaded
+    return []
+
+
+def read_call_logs(path=CALL_LOG_PATH, legacy_path=LEGACY_LOG_PATH):
+    """
+    All records, oldest first: the legacy JSON-array file, rotated segments
+    (plain or gzipped), then the live log.
+    """
+    records = []
+
+    if legacy_path and os.path.exists(legacy_path):
+        records.extend(_read_legacy(legacy_path))
+
+    for segment in sorted(glob.glob(_segment_glob(path))):
+        records.extend(_read_jsonl(segment))
+
+    if os.path.exists(path):
+        records.extend(_read_jsonl(path))
+
+    return records
+
+
+call_log = CallLogWriter()
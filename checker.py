@@ -1,38 +1,246 @@
-import requests
-import time
 import os
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import requests
 from dotenv import load_dotenv
+from call_log import read_call_logs
 
 load_dotenv()
 
-URL = os.getenv("PUBLIC_URL") + "/voice"
+URL = os.getenv("PUBLIC_URL", "http://localhost:8000") + "/voice"
+TO_NUMBER = os.getenv("TWILIO_PHONE_NUMBER", "+15555550199")
 
+# Used when calllog.json / calllog.jsonl hold no customer turns
+DEFAULT_SCRIPTS = [
+    ["How much is a screen replacement for an iPhone 13?", "Thank you"],
+    ["My Samsung battery drains fast, what does a battery cost?", "ok thanks bye"],
+    ["Do you fix charge ports?", "How long does it take?", "I'd like to book an appointment"],
+    ["Can I talk to a manager?"],
+]
 
-# ---- FIRST CALL (NO SPEECH) ----
-print("Simulating first call...\n")
+# TwiML verbs that end the call on Twilio's side
+END_TAGS = ("<Hangup", "<Dial")
+ERROR_MARKERS = ("server error", "Call error occurred")
 
-response = requests.post(URL, data={})
 
-print("First Call XML:")
-print(response.text)
-print("-" * 50)
+# ==========================================
+# TWILIO-SHAPED REQUESTS
+# ==========================================
+def new_call_sid() -> str:
+    return "CA" + uuid.uuid4().hex
 
-# ---- CONVERSATION LOOP ----
-while True:
-    text = input("You: ")
 
-    if text.lower() in ["exit", "quit"]:
-        break
+def caller_number() -> str:
+    return "+1555" + "".join(random.choice("0123456789") for _ in range(7))
 
-    data = {
-        "SpeechResult": text
+
+def twilio_form(call_sid: str, from_number: str, speech: str = None) -> dict:
+    form = {
+        "AccountSid": os.getenv("TWILIO_ACCOUNT_SID", "ACfake"),
+        "CallSid": call_sid,
+        "From": from_number,
+        "To": TO_NUMBER,
+        "CallStatus": "in-progress",
+        "Direction": "inbound",
     }
 
-    response = requests.post(URL, data=data)
+    if speech is not None:
+        form["SpeechResult"] = speech
+        form["Confidence"] = "0.92"
+
+    return form
+
+
+def load_scripts() -> list:
+    """
+    Caller turns of past calls (legacy calllog.json plus the JSONL log).
+    """
+    scripts = []
+
+    for record in read_call_logs():
+        turns = [
+            t.get("message")
+            for t in record.get("transcripts") or []
+            if t.get("speaker") == "CUSTOMER" and t.get("message")
+        ]
+        if turns:
+            scripts.append(turns)
+
+    return scripts or DEFAULT_SCRIPTS
+
+
+# ==========================================
+# INTERACTIVE MODE
+# ==========================================
+def interactive(url: str):
+    call_sid = new_call_sid()
+    from_number = caller_number()
+
+    # ---- FIRST CALL (NO SPEECH) ----
+    print(f"Simulating first call {call_sid}...\n")
 
-    print("\nRaw XML Response:")
+    response = requests.post(url, data=twilio_form(call_sid, from_number))
+
+    print("First Call XML:")
     print(response.text)
     print("-" * 50)
 
-    time.sleep(1)
+    # ---- CONVERSATION LOOP ----
+    while True:
+        text = input("You: ")
+
+        if text.lower() in ["exit", "quit"]:
+            break
+
+        started = time.perf_counter()
+        response = requests.post(url, data=twilio_form(call_sid, from_number, text))
+
+        print(f"\nRaw XML Response ({(time.perf_counter() - started) * 1000:.1f} ms):")
+        print(response.text)
+        print("-" * 50)
+
+        if any(tag in response.text for tag in END_TAGS):
+            break
+
+        time.sleep(1)
+
+
+# ==========================================
+# LOAD MODE
+# ==========================================
+def percentile(values, pct):
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    # nearest-rank
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_call(client, url, script, think_seconds, results):
+    """
+    One simulated caller: the greeting webhook, then one /voice POST per
+    scripted utterance until the TwiML hangs up or dials out.
+    """
+    call_sid = new_call_sid()
+    from_number = caller_number()
+
+    for turn, speech in enumerate([None] + script):
+        kind = "greeting" if speech is None else "turn"
+        started = time.perf_counter()
+
+        try:
+            response = await client.post(url, data=twilio_form(call_sid, from_number, speech))
+            body = response.text
+            ok = response.status_code == 200 and not any(m in body for m in ERROR_MARKERS)
+        except Exception as e:
+            body, ok = "", False
+            print(f"❌ {call_sid} turn {turn}: {type(e).__name__}: {e}")
+
+        results.append((kind, (time.perf_counter() - started) * 1000, ok))
+
+        if not ok or any(tag in body for tag in END_TAGS):
+            return
+
+        if think_seconds:
+            await asyncio.sleep(think_seconds * random.uniform(0.5, 1.5))
+
+
+async def load_test(args) -> dict:
+    import httpx
+
+    scripts = load_scripts()
+    results = []
+    semaphore = asyncio.Semaphore(args.concurrency or args.calls)
+
+    async def one_call(index):
+        if args.ramp:
+            await asyncio.sleep(args.ramp * index / args.calls)
+
+        async with semaphore:
+            script = random.choice(scripts)[:args.max_turns]
+            await run_call(client, args.url, script, args.think_ms / 1000, results)
+
+    limits = httpx.Limits(max_connections=args.concurrency or args.calls)
+
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*[one_call(i) for i in range(args.calls)])
+        wall = time.perf_counter() - started
+
+    return summarize(results, wall, args.calls, len(scripts))
+
+
+def summarize(results, wall, calls, scripts) -> dict:
+    summary = {
+        "calls": calls,
+        "scripts": scripts,
+        "requests": len(results),
+        "errors": sum(1 for _, _, ok in results if not ok),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 2) if wall else 0.0,
+        "calls_per_second": round(calls / wall, 2) if wall else 0.0,
+    }
+
+    for kind in ("greeting", "turn"):
+        latencies = [ms for k, ms, ok in results if k == kind and ok]
+        summary[kind] = {
+            "count": len(latencies),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "max_ms": round(max(latencies, default=0.0), 1),
+        }
+
+    return summary
+
+
+def print_summary(summary: dict):
+    print(
+        f"\n{summary['calls']} calls, {summary['requests']} requests, "
+        f"{summary['errors']} errors in {summary['wall_seconds']}s"
+    )
+    print(f"Throughput: {summary['throughput_rps']} req/s, {summary['calls_per_second']} calls/s\n")
+
+    print(f"{'':10}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for kind in ("greeting", "turn"):
+        s = summary[kind]
+        print(
+            f"{kind:10}{s['count']:>8}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}"
+            f"{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Talk to /voice interactively, or load-test it with --calls N"
+    )
+    parser.add_argument("--url", default=URL)
+    parser.add_argument("--calls", type=int, default=0, help="simulated calls (0 = interactive)")
+    parser.add_argument("--concurrency", type=int, default=0, help="calls in flight at once (default: all)")
+    parser.add_argument("--max-turns", type=int, default=6)
+    parser.add_argument("--think-ms", type=float, default=0, help="caller pause between turns")
+    parser.add_argument("--ramp", type=float, default=0, help="seconds over which calls start")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    if not args.calls:
+        interactive(args.url)
+    else:
+        summary = asyncio.run(load_test(args))
 
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            print_summary(summary)
@@ -0,0 +1,203 @@
+import os
+import zlib
+import hashlib
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from price_index import normalize
+
+load_dotenv()
+
+# ==========================================
+# ENV VARIABLES
+# ==========================================
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# openai: remote API; hashing / onnx: computed on this CPU, no network per turn
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "openai").lower()
+OPENAI_EMBEDDINGS_MODEL = os.getenv("OPENAI_EMBEDDINGS_MODEL", "text-embedding-ada-002")
+HASHING_EMBEDDINGS_DIM = int(os.getenv("HASHING_EMBEDDINGS_DIM", "384"))
+# Directory holding model.onnx and tokenizer.json (e.g. an exported all-MiniLM-L6-v2)
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", "./models/embeddings")
+ONNX_MAX_LENGTH = int(os.getenv("ONNX_MAX_LENGTH", "128"))
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 = onnxruntime default
+
+BACKENDS = ("openai", "hashing", "onnx")
+
+# Caches and generations written before backends were pluggable
+LEGACY_SIGNATURE = "openai:text-embedding-ada-002"
+
+# Vocabulary grows with callers' phrasing; stop memoizing past this
+HASHING_FEATURE_CACHE = 200_000
+
+_models = {}
+_signatures = {}
+_lock = threading.Lock()
+
+
+def _register_with_langchain(cls):
+    """
+    Make cls a virtual langchain Embeddings subclass (what FAISS checks for),
+    importing langchain only once a local model is actually built.
+    """
+    from langchain_core.embeddings import Embeddings
+
+    if not issubclass(cls, Embeddings):
+        Embeddings.register(cls)
+
+
+# ==========================================
+# LOCAL BACKENDS
+# ==========================================
+class HashingEmbeddings:
+    """
+    LangChain-compatible embedder: signed feature hashing of words and word
+    bigrams, L2-normalized. No network, no model file, identical vectors on
+    every run, and close texts share features. A query takes microseconds.
+    """
+
+    def __init__(self, dim: int = HASHING_EMBEDDINGS_DIM):
+        _register_with_langchain(HashingEmbeddings)
+        self.dim = dim
+        self._features = {}
+
+    def _feature(self, token: str):
+        feature = self._features.get(token)
+        if feature is None:
+            digest = zlib.crc32(token.encode("utf-8"))
+            feature = (digest % self.dim, 1.0 if digest & 0x80000000 else -1.0)
+            if len(self._features) < HASHING_FEATURE_CACHE:
+                self._features[token] = feature
+        return feature
+
+    def _embed(self, text: str):
+        words = normalize(text).split()
+        vector = np.zeros(self.dim, dtype="float32")
+
+        for token in words + [a + " " + b for a, b in zip(words, words[1:])]:
+            index, sign = self._feature(token)
+            vector[index] += sign
+
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts):
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text).tolist()
+
+
+class OnnxEmbeddings:
+    """
+    Sentence-transformer style model exported to ONNX: tokenize, run,
+    mean-pool over the attention mask, L2-normalize. Needs onnxruntime
+    and tokenizers; the model is read once and shared by all threads.
+    """
+
+    def __init__(self, model_path: str = ONNX_MODEL_PATH, max_length: int = ONNX_MAX_LENGTH):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        _register_with_langchain(OnnxEmbeddings)
+
+        options = onnxruntime.SessionOptions()
+        if ONNX_THREADS > 0:
+            options.intra_op_num_threads = ONNX_THREADS
+
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_path, "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {item.name for item in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        # First run allocates the arena; keep that off the first caller's turn
+        self._embed(["warmup"])
+
+    def _embed(self, texts):
+        encodings = self.tokenizer.encode_batch(list(texts))
+
+        ids = np.array([encoding.ids for encoding in encodings], dtype="int64")
+        mask = np.array([encoding.attention_mask for encoding in encodings], dtype="int64")
+
+        feed = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.zeros_like(ids)
+
+        output = self.session.run(None, {name: value for name, value in feed.items() if name in self.input_names})[0]
+
+        if output.ndim == 3:
+            weights = mask[:, :, None].astype("float32")
+            output = (output * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return (output / np.maximum(norms, 1e-12)).astype("float32")
+
+    def embed_documents(self, texts):
+        return self._embed(texts).tolist() if texts else []
+
+    def embed_query(self, text):
+        return self._embed([text])[0].tolist()
+
+
+# ==========================================
+# SELECTION
+# ==========================================
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def signature(backend: str = None) -> str:
+    """
+    Identifies the vector space a backend produces. Vectors (cached or in a
+    saved index) are only reused under the same signature, so changing the
+    backend, model or dimension forces a re-embed and a full rebuild.
+    """
+    backend = backend or EMBEDDINGS_BACKEND
+
+    if backend not in _signatures:
+        if backend == "openai":
+            value = f"openai:{OPENAI_EMBEDDINGS_MODEL}"
+        elif backend == "hashing":
+            value = f"hashing:{HASHING_EMBEDDINGS_DIM}"
+        elif backend == "onnx":
+            value = f"onnx:{_file_digest(os.path.join(ONNX_MODEL_PATH, 'model.onnx'))}:{ONNX_MAX_LENGTH}"
+        else:
+            raise ValueError(f"❌ Unknown EMBEDDINGS_BACKEND {backend!r} (expected one of {', '.join(BACKENDS)})")
+
+        _signatures[backend] = value
+
+    return _signatures[backend]
+
+
+def get_embeddings_model(backend: str = None, batch_size: int = 256):
+    """
+    The embedder used for both indexing and queries. Local models are built
+    once per process.
+    """
+    backend = backend or EMBEDDINGS_BACKEND
+
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+
+        return OpenAIEmbeddings(model=OPENAI_EMBEDDINGS_MODEL, openai_api_key=OPENAI_API_KEY, chunk_size=batch_size)
+
+    with _lock:
+        if backend not in _models:
+            if backend == "hashing":
+                _models[backend] = HashingEmbeddings()
+            elif backend == "onnx":
+                _models[backend] = OnnxEmbeddings()
+            else:
+                raise ValueError(f"❌ Unknown EMBEDDINGS_BACKEND {backend!r} (expected one of {', '.join(BACKENDS)})")
+
+            print(f"✅ Local embeddings ready ({signature(backend)})")
+
+        return _models[backend]
@@ -0,0 +1,302 @@
+import os
+import re
+import json
+import math
+import time
+import uuid
+import base64
+import random
+import asyncio
+import hashlib
+import argparse
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# ==========================================
+# LOCAL STAND-INS FOR EXTERNAL SERVICES
+# ==========================================
+# Run with e.g. `python fake_services.py twilio --port 9001 --latency-ms 150`
+# and point the agent at it with TWILIO_API_BASE=http://127.0.0.1:9001.
+# `python fake_services.py all --port 9001` starts twilio on 9001, openai on
+# 9002 and backend on 9003; then also set
+#   OPENAI_BASE_URL=http://127.0.0.1:9002/v1
+#   API_BASE_URL=http://127.0.0.1:9003
+
+LATENCY_MS = float(os.getenv("FAKE_LATENCY_MS", "0"))
+# Delay between streamed completion chunks
+TOKEN_MS = float(os.getenv("FAKE_TOKEN_MS", "20"))
+EMBEDDING_DIM = int(os.getenv("FAKE_EMBEDDING_DIM", "1536"))
+PRICE_ROWS = int(os.getenv("FAKE_PRICE_ROWS", "500"))
+
+
+async def simulate_latency():
+    if LATENCY_MS > 0:
+        await asyncio.sleep(LATENCY_MS / 1000)
+
+
+# ==========================================
+# TWILIO REST
+# ==========================================
+twilio_app = FastAPI()
+
+
+@twilio_app.post("/2010-04-01/Accounts/{account_sid}/Messages.json")
+async def twilio_send_message(account_sid: str, request: Request):
+    await simulate_latency()
+    form = await request.form()
+    return JSONResponse(status_code=201, content={
+        "sid": f"SM{uuid.uuid4().hex}",
+        "account_sid": account_sid,
+        "to": form.get("To"),
+        "from": form.get("From"),
+        "body": form.get("Body"),
+        "status": "queued",
+    })
+
+
+@twilio_app.post("/2010-04-01/Accounts/{account_sid}/Calls/{call_sid}/Recordings.json")
+async def twilio_start_recording(account_sid: str, call_sid: str):
+    await simulate_latency()
+    return JSONResponse(status_code=201, content={
+        "sid": f"RE{uuid.uuid4().hex}",
+        "account_sid": account_sid,
+        "call_sid": call_sid,
+        "status": "in-progress",
+    })
+
+
+# ==========================================
+# OPENAI
+# ==========================================
+openai_app = FastAPI()
+
+CANNED_REPLIES = [
+    "That repair usually takes about an hour. Is there anything else I can help with?",
+    "We can do that for you today. Would you like to book an appointment?",
+    "I don't have a price for that model yet. Could you tell me the exact model?",
+]
+
+
+def fake_embedding(item) -> list:
+    """
+    Deterministic hashed bag-of-words vector, so similar texts land near
+    each other and retrieval behaves plausibly. Token-id arrays (as sent
+    by langchain) are hashed per id.
+    """
+    tokens = [str(t) for t in item] if isinstance(item, list) else re.findall(r"[a-z0-9]+", str(item).lower())
+    vector = [0.0] * EMBEDDING_DIM
+
+    for token in tokens or [""]:
+        digest = hashlib.md5(token.encode("utf-8")).digest()
+        index = int.from_bytes(digest[:4], "little") % EMBEDDING_DIM
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def fake_reply(messages) -> str:
+    question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    return CANNED_REPLIES[int(hashlib.md5(str(question).encode("utf-8")).hexdigest(), 16) % len(CANNED_REPLIES)]
+
+
+def fake_usage(messages, reply) -> dict:
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+    completion_tokens = len(reply.split())
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+@openai_app.get("/v1/models/{model}")
+async def openai_model(model: str):
+    return {"id": model, "object": "model", "owned_by": "fake"}
+
+
+@openai_app.post("/v1/embeddings")
+async def openai_embeddings(request: Request):
+    await simulate_latency()
+    body = await request.json()
+    inputs = body.get("input")
+
+    if isinstance(inputs, str) or (isinstance(inputs, list) and inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+
+    return {
+        "object": "list",
+        "model": body.get("model"),
+        "data": [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(item)}
+            for i, item in enumerate(inputs or [])
+        ],
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+@openai_app.post("/v1/chat/completions")
+async def openai_chat(request: Request):
+    await simulate_latency()
+    body = await request.json()
+    reply = fake_reply(body.get("messages", []))
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": body.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": fake_usage(body.get("messages", []), reply),
+        }
+
+    async def events():
+        for word in re.findall(r"\S+\s*", reply):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model"),
+                "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            if TOKEN_MS > 0:
+                await asyncio.sleep(TOKEN_MS / 1000)
+
+        done = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": body.get("model"),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        yield f"data: {json.dumps(done)}\n\n"
+
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model"),
+                "choices": [],
+                "usage": fake_usage(body.get("messages", []), reply),
+            }
+            yield f"data: {json.dumps(usage)}\n\n"
+
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+# ==========================================
+# STORE BACKEND
+# ==========================================
+backend_app = FastAPI()
+backend_app.state.call_logs = 0
+
+BRANDS = {
+    "Apple": ["iPhone 11", "iPhone 12", "iPhone 13", "iPhone 13 Pro", "iPhone 14", "iPhone 15 Pro Max"],
+    "Samsung": ["Galaxy S21", "Galaxy S22", "Galaxy S23 Ultra", "Galaxy A54"],
+    "Google": ["Pixel 6", "Pixel 7", "Pixel 8 Pro"],
+    "Nintendo": ["Switch", "Switch OLED"],
+}
+REPAIRS = ["Battery", "LCD", "OLED", "Back Glass", "Charge Port", "Back Camera", "Front Cam", "Housing"]
+
+
+def fake_jwt(ttl=3600) -> str:
+    def part(obj):
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).rstrip(b"=").decode()
+
+    return f"{part({'alg': 'none', 'typ': 'JWT'})}.{part({'exp': int(time.time()) + ttl})}.fake"
+
+
+def fake_price_rows(count=PRICE_ROWS) -> list:
+    rng = random.Random(42)
+    models = [(brand, model) for brand, names in BRANDS.items() for model in names]
+    rows = []
+
+    for i in range(count):
+        brand, model = models[i % len(models)]
+        repair = REPAIRS[(i // len(models)) % len(REPAIRS)]
+        rows.append({
+            "id": i + 1,
+            "store_name": "Fake Store",
+            "brand_name": brand,
+            "device_model_name": model if i < len(models) * len(REPAIRS) else f"{model} Rev {i}",
+            "repair_type_name": repair,
+            "category_name": "Phone" if brand != "Nintendo" else "Console",
+            "price": rng.choice([49, 79, 89.99, 129, 149, 199, 249]),
+        })
+
+    return rows
+
+
+@backend_app.post("/auth/login/")
+async def backend_login():
+    await simulate_latency()
+    return {"tokens": {"access": fake_jwt(), "refresh": fake_jwt(86400)}}
+
+
+@backend_app.get("/api/v1/stores/{store_id}/ai-behavior")
+async def backend_ai_behavior(store_id: str):
+    await simulate_latency()
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai_behavior.json")) as f:
+        return json.load(f)
+
+
+@backend_app.get("/api/v1/services/price-list/")
+async def backend_price_list():
+    await simulate_latency()
+    return fake_price_rows()
+
+
+@backend_app.post("/api/v1/call/details/")
+async def backend_call_details(request: Request):
+    await simulate_latency()
+    await request.body()
+    backend_app.state.call_logs += 1
+    return JSONResponse(status_code=201, content={"id": backend_app.state.call_logs})
+
+
+APPS = {
+    "twilio": twilio_app,
+    "openai": openai_app,
+    "backend": backend_app,
+}
+
+
+async def serve_all(base_port: int):
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=base_port + i, log_level="warning"))
+        for i, app in enumerate(APPS.values())
+    ]
+
+    for i, name in enumerate(APPS):
+        print(f"{name:8} http://127.0.0.1:{base_port + i}")
+
+    await asyncio.gather(*[server.serve() for server in servers])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in service")
+    parser.add_argument("service", choices=sorted(APPS) + ["all"])
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    parser.add_argument("--token-ms", type=float, default=TOKEN_MS)
+    args = parser.parse_args()
+
+    LATENCY_MS = args.latency_ms
+    TOKEN_MS = args.token_ms
+
+    if args.service == "all":
+        asyncio.run(serve_all(args.port))
+    else:
+        uvicorn.run(APPS[args.service], host="127.0.0.1", port=args.port, log_level="warning")
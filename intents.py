@@ -0,0 +1,229 @@
+from dataclasses import dataclass
+from price_index import REPAIR_SYNONYMS, normalize
+
+# ==========================================
+# VOCABULARY
+# ==========================================
+EXIT_PHRASES = [
+    "no thank you",
+    "no thanks",
+    "thanks but no thanks",
+    "that's all",
+    "that’s it",
+    "nothing else",
+    "nothing else today",
+    "nothing more",
+    "i'm good",
+    "i’m good thanks",
+    "i'm all set",
+    "i’m all set thanks",
+    "i'm okay",
+    "that’s fine",
+    "that works for me",
+    "that should do it",
+    "that covers it",
+    "that does it",
+    "that'll do",
+    "that sounds good",
+    "sounds good",
+    "thanks",
+    "thank you",
+    "thanks a lot",
+    "thank you so much",
+    "appreciate it",
+    "i appreciate it",
+    "thanks for your help",
+    "thanks for your time",
+    "thanks for the info",
+    "alright thanks",
+    "okay thanks",
+    "ok thanks",
+    "great thanks",
+    "perfect thanks",
+    "that answers my question",
+    "that helps",
+    "that clears it up",
+    "that makes sense",
+    "that explains it",
+    "bye",
+    "goodbye",
+    "have a good day",
+    "have a great day",
+    "talk to you later",
+    "alright bye",
+    "okay bye",
+    "i'll think about it",
+    "i'll get back to you",
+    "that's all i needed"
+]
+
+# Matched as word prefixes: "book" also covers "booking" and "booked"
+BOOKING_WORDS = ["appointment", "book", "schedule"]
+
+REPAIR_TYPES = [
+    {"id": 1, "name": "Battery"},
+    {"id": 2, "name": "LCD"},
+    {"id": 3, "name": "Software"},
+    {"id": 4, "name": "OLED"},
+    {"id": 5, "name": "OEM"},
+    {"id": 6, "name": "Back Camera"},
+    {"id": 7, "name": "Charge Port"},
+    {"id": 8, "name": "Back Glass"},
+    {"id": 9, "name": "Camera Glass"},
+    {"id": 10, "name": "UB Screen"},
+    {"id": 11, "name": "Dock"},
+    {"id": 12, "name": "Octa / UB"},
+    {"id": 13, "name": "Housing"},
+    {"id": 14, "name": "Front Cam"},
+    {"id": 15, "name": "Glass"},
+    {"id": 16, "name": "HDMI / RETIMER"},
+    {"id": 17, "name": "HDD 500GB"},
+    {"id": 18, "name": "HDD 1TB"},
+    {"id": 19, "name": "SSD 500GB"},
+    {"id": 20, "name": "SSD 1TB"},
+    {"id": 21, "name": "DISK DRIVE"},
+    {"id": 22, "name": "POWER SUPPLY"},
+    {"id": 23, "name": "REFLASH"},
+    {"id": 24, "name": "Device Cleaning"},
+    {"id": 25, "name": "Digi Only"},
+    {"id": 26, "name": "LCD Only"},
+    {"id": 27, "name": "Charging Repair"},
+    {"id": 28, "name": "Head Jack"},
+    {"id": 29, "name": "SD Card Reader"},
+    {"id": 30, "name": "Card Reader"},
+    {"id": 31, "name": "Cooling Fan"},
+    {"id": 32, "name": "Joycon Stick/Rail"},
+    {"id": 33, "name": "CPU"},
+]
+
+UNKNOWN_ISSUE = "UNKNOWN"
+
+
+@dataclass(frozen=True)
+class Intents:
+    exit: bool = False
+    transfer: bool = False
+    booking: bool = False
+    issue: str = UNKNOWN_ISSUE
+
+
+class IntentMatcher:
+    """
+    Every phrase set (exit, transfer keywords, booking words, repair names
+    and synonyms) compiled into one word trie, so a turn is a single
+    left-to-right scan of the normalized utterance whatever the vocabulary
+    size. At each word the longest phrase wins, and phrases only match
+    whole words, so "ok" no longer fires inside "book".
+
+    Single-word booking words and repair synonyms also match as prefixes
+    ("booking", "screens"), like the synonym lookup in price_index.
+
+    Build a new matcher when behavior or pricing changes; instances are
+    read-only and safe to share between requests.
+    """
+
+    def __init__(self, transfer_keywords=(), repair_names=()):
+        # word -> child node; the None key holds [(intent, value, rank)]
+        self._trie = {}
+        # stem -> [(intent, value, rank)] for single-word prefix matches
+        self._stems = {}
+        self._phrases = 0
+
+        for phrase in EXIT_PHRASES:
+            self._add(phrase, "exit")
+
+        for keyword in transfer_keywords:
+            self._add(keyword, "transfer")
+
+        for word in BOOKING_WORDS:
+            self._add(word, "booking", prefix=True)
+
+        # Direct repair names beat synonyms; earlier entries beat later ones
+        names = [repair["name"] for repair in REPAIR_TYPES]
+        names += [name for name in repair_names if name and name not in names]
+
+        for rank, name in enumerate(names):
+            self._add(name, "issue", name, rank)
+
+        for rank, (keyword, mapped) in enumerate(REPAIR_SYNONYMS.items(), start=len(names)):
+            self._add(keyword, "issue", mapped[0], rank, prefix=True)
+
+        self._stem_lengths = sorted({len(stem) for stem in self._stems}, reverse=True)
+
+    def _add(self, phrase, intent, value=None, rank=0, prefix=False):
+        words = normalize(phrase).split()
+        if not words:
+            return
+
+        action = (intent, value, rank)
+        node = self._trie
+        for word in words:
+            node = node.setdefault(word, {})
+
+        if None not in node:
+            self._phrases += 1
+        node.setdefault(None, []).append(action)
+
+        if prefix and len(words) == 1:
+            self._stems.setdefault(words[0], []).append(action)
+
+    def __len__(self):
+        return self._phrases
+
+    def _longest_at(self, words, i):
+        node, end, actions = self._trie, i, None
+
+        for j in range(i, len(words)):
+            node = node.get(words[j])
+            if node is None:
+                break
+            if None in node:
+                end, actions = j + 1, node[None]
+
+        return end, actions
+
+    def _stem_actions(self, word):
+        for length in self._stem_lengths:
+            if length < len(word):
+                actions = self._stems.get(word[:length])
+                if actions:
+                    return actions
+        return None
+
+    def match(self, utterance: str) -> Intents:
+        words = normalize(utterance).split()
+        found = set()
+        issue, issue_rank = UNKNOWN_ISSUE, None
+        i = 0
+
+        while i < len(words):
+            end, actions = self._longest_at(words, i)
+
+            if actions is None:
+                end, actions = i + 1, self._stem_actions(words[i])
+
+            for intent, value, rank in actions or ():
+                if intent != "issue":
+                    found.add(intent)
+                elif issue_rank is None or rank < issue_rank:
+                    issue, issue_rank = value, rank
+
+            i = end
+
+        return Intents(
+            exit="exit" in found,
+            transfer="transfer" in found,
+            booking="booking" in found,
+            issue=issue,
+        )
+
+
+def build_intent_matcher(behavior_data: dict = None, price_rows=None) -> IntentMatcher:
+    transfer_keywords = [
+        item.get("keyword", "")
+        for item in (behavior_data or {}).get("auto_transfer_keywords", [])
+        if isinstance(item, dict)
+    ]
+    repair_names = [row.get("repair_type_name") for row in price_rows or []]
+
+    return IntentMatcher(transfer_keywords, repair_names)
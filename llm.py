@@ -0,0 +1,245 @@
+import os
+import re
+import time
+import asyncio
+import httpx
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+# ==========================================
+# ENV VARIABLES
+# ==========================================
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+
+# Whole-turn deadline (queueing + request), must stay well under Twilio's 15s
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "8"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+LLM_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+
+_http_client = None
+_client = None
+_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+
+# ==========================================
+# POOLED ASYNC CLIENT
+# ==========================================
+def get_client() -> AsyncOpenAI:
+    """
+    Return the process-wide AsyncOpenAI client backed by a keep-alive pool.
+    """
+    global _http_client, _client
+
+    if _client is None:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+        _client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            http_client=_http_client,
+            max_retries=LLM_MAX_RETRIES,
+        )
+
+    return _client
+
+
+async def warmup():
+    """
+    Open pooled connections (DNS + TLS) before the first call arrives.
+    """
+    client = get_client()
+
+    async def _ping():
+        try:
+            await client.models.retrieve(LLM_MODEL)
+        except Exception as e:
+            print("⚠ LLM warmup failed:", e)
+
+    await asyncio.gather(*[_ping() for _ in range(min(LLM_KEEPALIVE_CONNECTIONS, 4))])
+    print("✅ LLM connections warmed")
+
+
+async def close():
+    global _http_client, _client
+
+    if _client is not None:
+        await _client.close()
+
+    _client = None
+    _http_client = None
+
+
+# ==========================================
+# METRICS
+# ==========================================
+def _outcome(error) -> str:
+    if error is None:
+        return "ok"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    return "error"
+
+
+def _record(mode: str, started: float, error=None):
+    outcome = _outcome(error)
+    metrics.LLM_REQUESTS.inc(mode=mode, outcome=outcome)
+    metrics.LLM_SECONDS.observe(time.perf_counter() - started, mode=mode, outcome=outcome)
+
+
+def _record_usage(usage):
+    if usage is not None:
+        metrics.LLM_TOKENS.inc(usage.prompt_tokens or 0, kind="prompt")
+        metrics.LLM_TOKENS.inc(usage.completion_tokens or 0, kind="completion")
+
+
+# ==========================================
+# CHAT COMPLETION
+# ==========================================
+async def _complete(messages, max_tokens, temperature):
+    queued = time.perf_counter()
+
+    async with _semaphore:
+        metrics.LLM_QUEUE_SECONDS.observe(time.perf_counter() - queued)
+        metrics.LLM_IN_FLIGHT.inc()
+
+        try:
+            response = await get_client().chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+        finally:
+            metrics.LLM_IN_FLIGHT.dec()
+
+    _record_usage(response.usage)
+    return response.choices[0].message.content.strip()
+
+
+async def chat_completion(messages, max_tokens=60, temperature=0.2, timeout=None) -> str:
+    """
+    Run one conversational turn without blocking the event loop.
+
+    Raises asyncio.TimeoutError when the deadline (including time spent
+    waiting for a concurrency slot) is exceeded.
+    """
+    started = time.perf_counter()
+
+    try:
+        reply = await asyncio.wait_for(
+            _complete(messages, max_tokens, temperature),
+            timeout=timeout or LLM_TIMEOUT,
+        )
+    except BaseException as e:
+        _record("complete", started, e)
+        raise
+
+    _record("complete", started)
+    return reply
+
+
+# ==========================================
+# STREAMING COMPLETION
+# ==========================================
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+async def stream_completion(messages, max_tokens=60, temperature=0.2, timeout=None):
+    """
+    Yield reply tokens as they arrive. The deadline covers the whole stream.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (timeout or LLM_TIMEOUT)
+    started = time.perf_counter()
+
+    def remaining():
+        return max(deadline - loop.time(), 0)
+
+    try:
+        await asyncio.wait_for(_semaphore.acquire(), timeout=remaining())
+    except BaseException as e:
+        _record("stream", started, e)
+        raise
+
+    metrics.LLM_QUEUE_SECONDS.observe(time.perf_counter() - started)
+    metrics.LLM_IN_FLIGHT.inc()
+    first_token = True
+
+    try:
+        stream = await asyncio.wait_for(
+            get_client().chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                # Final chunk carries token usage (and no choices)
+                stream_options={"include_usage": True},
+            ),
+            timeout=remaining(),
+        )
+
+        try:
+            chunks = stream.__aiter__()
+
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining())
+                except StopAsyncIteration:
+                    break
+
+                _record_usage(getattr(chunk, "usage", None))
+
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token:
+                        first_token = False
+                        metrics.LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+    except BaseException as e:
+        _record("stream", started, e)
+        raise
+
+    else:
+        _record("stream", started)
+
+    finally:
+        metrics.LLM_IN_FLIGHT.dec()
+        _semaphore.release()
+
+
+async def stream_sentences(messages, **kwargs):
+    """
+    Group streamed tokens into whole sentences so TTS can start on the first one.
+    """
+    buffer = ""
+
+    async for token in stream_completion(messages, **kwargs):
+        buffer += token
+        parts = SENTENCE_END.split(buffer)
+
+        for sentence in parts[:-1]:
+            if sentence.strip():
+                yield sentence.strip()
+
+        buffer = parts[-1]
+
+    if buffer.strip():
+        yield buffer.strip()
@@ -1,53 +1,59 @@
 import os
 import json
-import pytz
-import requests
-from datetime import datetime, timedelta
+from datetime import datetime
 from pydantic import BaseModel
-from fastapi import FastAPI, Request, Header, HTTPException, status, Depends
-from fastapi.responses import Response
-from twilio.twiml.voice_response import VoiceResponse, Gather
-from openai import OpenAI
+from fastapi import FastAPI, Request, Header, HTTPException, status, Depends, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, PlainTextResponse, JSONResponse
+from twilio.twiml.voice_response import VoiceResponse
 from dotenv import load_dotenv
-from rag import build_vectorstore, rebuild_vectorstore, load_or_build_vectorstore
+from behavior import (
+    compile_behavior, CALL_ERROR_TWIML, SERVER_ERROR_TWIML, INITIALIZING_TWIML,
+    TRANSFER_MESSAGE, BOOKING_MESSAGE, INITIALIZING_MESSAGE,
+)
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from twilio.base.exceptions import TwilioRestException
 import secrets
-from auth import get_auth_token
-from twilio.rest import Client
+import auth
+from auth import get_auth_token, token_manager
+import twilio_client
 from fastapi import BackgroundTasks
 import asyncio
-import httpx
-from pydub import AudioSegment
+import time
 from fastapi.staticfiles import StaticFiles
+import llm
+import metrics
+import rag
+from answer_cache import answer_cache
+from call_log import call_log
+from sessions import create_session_backend, session_scope, trim_messages
+from stores import StoreRegistry, load_store_configs, behavior_stamp_path, STORE_LOAD_WAIT_SECONDS
+from outbox import Outbox
+import recordings
+from recordings import RECORDINGS_DIR
 
 load_dotenv()
 security = HTTPBearer()
 
 BASE_URL = os.getenv("API_BASE_URL")
 ID = os.getenv("STORE_ID")
-AI_BEHAVIOR_URL = f"{BASE_URL}/api/v1/stores/{ID}/ai-behavior"
 CALL_LOG_API_URL = f"{BASE_URL}/api/v1/call/details/"
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 STORE_NAME = os.getenv("STORE_NAME")
 PUBLIC_URL = os.getenv("PUBLIC_URL")
 AUDIO_URL = os.getenv("AUDIO_URL")
-TOKEN = get_auth_token()
 app = FastAPI()
 
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-CALL_SESSIONS = {}
+# In-process by default; SESSION_BACKEND=sqlite shares calls across uvicorn workers
+CALL_SESSIONS = create_session_backend()
 
-LOG_FILE = "calllog.json"
+outbox = Outbox(CALL_LOG_API_URL, token_provider=token_manager.aget_token)
 
-rag_lock = asyncio.Lock()
-global retriever, behavior_data
-retriever = None 
-behavior_data = {} 
+# Workers poll stamps and CURRENT to pick up /update-system and /update-rag hits served by a sibling
+WORKER_SYNC_SECONDS = float(os.getenv("WORKER_SYNC_SECONDS", "5"))
+# Startup keeps retrying whichever part of the default store failed to load
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "30"))
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-RECORDINGS_DIR = os.path.join(BASE_DIR, "recordings")  # folder where MP3s are
+os.makedirs(RECORDINGS_DIR, exist_ok=True)
 
 app.mount(
     "/recordings",
@@ -55,118 +61,169 @@ app.mount(
     name="recordings",
 )
 
-async def rebuild_vectorstore_safe():
-    global retriever
+async def rebuild_vectorstore_safe(store):
+    """
+    Rebuild in a worker thread; rag publishes the new retriever atomically.
+    Hits that arrive while a rebuild is running are coalesced into one
+    follow-up rebuild. Only stores marked stale are rebuilt: one another
+    worker already refreshed just picks up its generation.
+    """
+    store.rag_rebuild_pending = True
+
+    if store.rag_lock.locked():
+        print(f"RAG rebuild already running for store {store.store_id}, queued one more pass.")
+        return
 
-    async with rag_lock:
-        retriever = rebuild_vectorstore()
+    async with store.rag_lock:
+        while store.rag_rebuild_pending:
+            store.rag_rebuild_pending = False
+
+            try:
+                await asyncio.to_thread(store.index.rebuild, if_stale=True)
+                store.refresh_intents()
+                answer_cache.invalidate(f"pricing updated for store {store.store_id}", scope=store.store_id)
+            except Exception as e:
+                print("❌ RAG rebuild failed:", e)
+
+    STORES.evict()
 
 async def cleanup_sessions():
     while True:
-        now = datetime.utcnow()
-        expired = []
+        expired = await CALL_SESSIONS.evict_expired()
 
-        for sid, session in CALL_SESSIONS.items():
-            if (now - session["started_at"]).seconds > 1800:
-                expired.append(sid)
+        if expired:
+            print(f"🧹 Dropped {expired} idle call sessions")
 
-        for sid in expired:
-            CALL_SESSIONS.pop(sid, None)
+        await asyncio.sleep(60)
 
-        await asyncio.sleep(300)
 
-
-async def send_call_log(call_sid: str):
+def read_behavior_stamp(path: str) -> float:
     try:
-        if call_sid not in CALL_SESSIONS:
-            return
-
-        session = CALL_SESSIONS[call_sid]
-        total_seconds = int((datetime.utcnow() - session["started_at"]).total_seconds())
-        minutes = total_seconds // 60
-        seconds = total_seconds % 60
-        url = f"{AUDIO_URL}/{call_sid}_1.mp3"
-
-        payload = {
-            "phone_number": session.get("phone_number"),
-            "issue": session.get("issue"),
-            "store": session.get("store_id"),
-            "call_type": session.get("call_type", "AI_RESOLVED"),
-            "outcome": session.get("outcome", "QUOTE_PROVIDED"),
-            "duration": f"{minutes:02}:{seconds:02}",
-            "started_at": session.get("started_at").isoformat(),
-            "ended_at": datetime.utcnow().isoformat(),
-            "audio_url": url,
-            "transcripts": session.get("transcripts")
-        }
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
 
-        # =====================================
-        # 1⃣ SAVE LOCALLY TO JSON FILE
-        # =====================================
-        data = [] 
 
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, "r") as f:
-                try:
-                    loaded = json.load(f)
-                    if isinstance(loaded, dict): data = [loaded]
-                    elif isinstance(loaded, list): data = loaded
-                    else:
-                        data = []
- 
-                except:
-                    data = []
-        else:
-            data = []
-
-        data.append(payload)
-
-        with open(LOG_FILE, "w") as f:
-            json.dump(data, f, indent=4)
-        print(data)
-        print("💾 Saved locally to JSON")
-
-        # =====================================
-        # 2⃣ SEND TO /save-call-log ENDPOINT
-        # =====================================
-
-        async with httpx.AsyncClient() as client:
-             response = await client.post(
-              CALL_LOG_API_URL,
-              json=payload,
-              headers={
-            "Authorization": f"Bearer {TOKEN}",
-            "Content-Type": "application/json"
-        }
-    )
+def touch_behavior_stamp(path: str) -> float:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "a"):
+        pass
+    os.utime(path, None)
+
+    return read_behavior_stamp(path)
+
+
+async def sync_workers():
+    """
+    Keep this worker's loaded stores in step with the other uvicorn workers:
+    reload behavior when a store's stamp moves, rebuild stores a global
+    /update-rag marked stale, and load a generation another worker published.
+    """
+    while True:
+        await asyncio.sleep(WORKER_SYNC_SECONDS)
+
+        for store in STORES.loaded():
+            try:
+                stamp = read_behavior_stamp(store.stamp_path)
 
-        print("Call log status:", response.status_code)
+                if stamp > store.behavior_stamp:
+                    store.behavior_stamp = stamp
+                    store.behavior = await asyncio.to_thread(fetch_behavior, store.config)
+                    store.refresh_intents()
+                    answer_cache.invalidate("behavior updated by another worker", scope=store.store_id)
 
-        print("✅ Call log sent to API")
+                if store.rag_lock.locked():
+                    continue
 
-        # =====================================
-        # CLEANUP MEMORY
-        # =====================================
+                if await asyncio.to_thread(store.index.is_stale):
+                    asyncio.create_task(rebuild_vectorstore_safe(store))
+                elif await asyncio.to_thread(store.index.sync_current_generation):
+                    store.refresh_intents()
+                    answer_cache.invalidate("pricing updated by another worker", scope=store.store_id)
+
+            except Exception as e:
+                print(f"❌ Worker sync failed for store {store.store_id}:", e)
+
+
+async def send_call_log(call_sid: str):
+    try:
+        async with CALL_SESSIONS.lock(call_sid):
+            session = await CALL_SESSIONS.load(call_sid)
 
-        CALL_SESSIONS.pop(call_sid, None)
+            if session is None:
+                return
+
+            await deliver_call_log(call_sid, session)
+
+            # =====================================
+            # CLEANUP SESSION
+            # =====================================
+            await CALL_SESSIONS.delete(call_sid)
 
     except Exception as e:
         print("❌ Failed sending call log:", e)
 
+
+async def deliver_call_log(call_sid: str, session: dict):
+    total_seconds = int((datetime.utcnow() - session["started_at"]).total_seconds())
+    minutes = total_seconds // 60
+    seconds = total_seconds % 60
+    url = f"{AUDIO_URL}/{call_sid}_1.mp3"
+
+    payload = {
+        "phone_number": session.get("phone_number"),
+        "issue": session.get("issue"),
+        "store": session.get("store_id"),
+        "call_type": session.get("call_type", "AI_RESOLVED"),
+        "outcome": session.get("outcome", "QUOTE_PROVIDED"),
+        "duration": f"{minutes:02}:{seconds:02}",
+        "started_at": session.get("started_at").isoformat(),
+        "ended_at": datetime.utcnow().isoformat(),
+        "audio_url": url,
+        "transcripts": session.get("transcripts")
+    }
+
+    # =====================================
+    # 1⃣ SAVE LOCALLY (append-only JSONL)
+    # =====================================
+    call_log.write(payload)
+    print("💾 Queued local call log")
+
+    # =====================================
+    # 2⃣ QUEUE FOR /call/details/ (durable outbox)
+    # =====================================
+    await outbox.enqueue(payload)
+    print("✅ Call log queued for API")
+
+
+async def mark_dropped(call_sid: str) -> bool:
+    """
+    Flag an existing session as dropped; False if the call has no session.
+    """
+    async with session_scope(CALL_SESSIONS, call_sid) as session:
+        if session is None:
+            return False
+
+        session["call_type"] = "DROPPED"
+        session["outcome"] = "CALL_DROPPED"
+        return True
+
 # ==========================================
 # LOAD AI BEHAVIOR
 # ==========================================
 
 
-def load_ai_behavior():
+def load_ai_behavior(store_id=None):
 
-    TOKEN = get_auth_token()
+    token = get_auth_token()
 
     try:
-        response = requests.get(
-            AI_BEHAVIOR_URL,
+        response = auth.get_session().get(
+            f"{BASE_URL}/api/v1/stores/{store_id or ID}/ai-behavior",
+            timeout=20,
             headers={
-                "Authorization": f"Bearer {TOKEN}",
+                "Authorization": f"Bearer {token}",
                 "Content-Type": "application/json"
             }
         )
@@ -193,163 +250,64 @@ def load_ai_behavior():
         return {}
 
 
-# ==========================================
-# BUSINESS HOURS CHECK (Timezone Aware)
-# ==========================================
-
-def is_business_open(behavior_data):
-
-    # Current time (change timezone if needed)
-    tz = pytz.timezone("America/New_York")
-    now = datetime.now(tz)
-
-    current_day = now.weekday()  # Monday = 0
-    current_time = now.time()
-
-    business_hours = behavior_data.get("business_hours", [])
-
-    for day_config in business_hours:
-
-        day_number = day_config.get("day")
-
-
-        if day_number == current_day:
-
-            if not day_config.get("is_open"):
-                return True
-
-            open_time = datetime.strptime(
-                day_config["open_time"], "%H:%M:%S"
-            ).time()
-
-            close_time = datetime.strptime(
-                day_config["close_time"], "%H:%M:%S"
-            ).time()
+def fetch_behavior(config):
+    """
+    Fetch and compile a store's AI behavior into a fresh snapshot. Blocking.
+    """
+    return compile_behavior(
+        load_ai_behavior(config.store_id),
+        manager_number=config.manager_number,
+        store_name=config.name,
+    )
 
-            #return open_time <= current_time <= close_time
 
-    return True
+async def load_store_behavior(store):
+    store.behavior_stamp = read_behavior_stamp(store.stamp_path)
+    store.behavior = await asyncio.to_thread(fetch_behavior, store.config)
 
 
+async def load_store_context(store):
+    """
+    Behavior (one login + fetch) and the index load run side by side, and
+    each is kept as soon as it arrives: calling this again only redoes the
+    part that is still missing. Raises if the store has no index, so the
+    registry doesn't serve it.
+    """
+    parts = []
 
+    if not store.behavior:
+        parts.append(load_store_behavior(store))
+    if store.index.get_snapshot().retriever is None:
+        parts.append(asyncio.to_thread(store.index.load_or_build))
 
-def get_dynamic_hours(behavior_data):
+    results = await asyncio.gather(*parts, return_exceptions=True)
+    store.refresh_intents()
 
-    business_hours = behavior_data.get("business_hours", [])
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
 
-    day_map = {
-        0: "Monday",
-        1: "Tuesday",
-        2: "Wednesday",
-        3: "Thursday",
-        4: "Friday",
-        5: "Saturday",
-        6: "Sunday"
-    }
+    if store.index.get_snapshot().retriever is None:
+        raise ValueError(f"no price list for store {store.store_id}")
 
-    formatted_hours = []
-
-    for day_config in business_hours:
-        day_number = day_config.get("day")
-        day_name = day_map.get(day_number, f"Day {day_number}")
-
-        if not day_config.get("is_open"):
-            formatted_hours.append(f"{day_name}: Closed")
-        else:
-            open_time = day_config.get("open_time", "")[:5]
-            close_time = day_config.get("close_time", "")[:5]
-            formatted_hours.append(f"{day_name}: {open_time} - {close_time}")
-
-    return "\n".join(formatted_hours)
-
-
-def detect_issue(user_input: str) -> str:
-    text = user_input.lower()
-
-    REPAIR_TYPES = [
-    {"id": 1, "name": "Battery"},
-    {"id": 2, "name": "LCD"},
-    {"id": 3, "name": "Software"},
-    {"id": 4, "name": "OLED"},
-    {"id": 5, "name": "OEM"},
-    {"id": 6, "name": "Back Camera"},
-    {"id": 7, "name": "Charge Port"},
-    {"id": 8, "name": "Back Glass"},
-    {"id": 9, "name": "Camera Glass"},
-    {"id": 10, "name": "UB Screen"},
-    {"id": 11, "name": "Dock"},
-    {"id": 12, "name": "Octa / UB"},
-    {"id": 13, "name": "Housing"},
-    {"id": 14, "name": "Front Cam"},
-    {"id": 15, "name": "Glass"},
-    {"id": 16, "name": "HDMI / RETIMER"},
-    {"id": 17, "name": "HDD 500GB"},
-    {"id": 18, "name": "HDD 1TB"},
-    {"id": 19, "name": "SSD 500GB"},
-    {"id": 20, "name": "SSD 1TB"},
-    {"id": 21, "name": "DISK DRIVE"},
-    {"id": 22, "name": "POWER SUPPLY"},
-    {"id": 23, "name": "REFLASH"},
-    {"id": 24, "name": "Device Cleaning"},
-    {"id": 25, "name": "Digi Only"},
-    {"id": 26, "name": "LCD Only"},
-    {"id": 27, "name": "Charging Repair"},
-    {"id": 28, "name": "Head Jack"},
-    {"id": 29, "name": "SD Card Reader"},
-    {"id": 30, "name": "Card Reader"},
-    {"id": 31, "name": "Cooling Fan"},
-    {"id": 32, "name": "Joycon Stick/Rail"},
-    {"id": 33, "name": "CPU"},
-]
-    # First try direct name match
-    for repair in REPAIR_TYPES:
-        if repair["name"].lower() in text:
-            return repair["name"]
-
-    # Synonym mapping (important for real conversations)
-    SYNONYMS = {
-        "screen": ["LCD", "OLED", "Glass", "UB Screen"],
-        "battery": ["Battery"],
-        "charge": ["Charge Port", "Charging Repair"],
-        "camera": ["Back Camera", "Front Cam", "Camera Glass"],
-        "software": ["Software", "REFLASH"],
-        "storage": ["HDD 500GB", "HDD 1TB", "SSD 500GB", "SSD 1TB"],
-        "hdmi": ["HDMI / RETIMER"],
-        "fan": ["Cooling Fan"],
-        "cpu": ["CPU"],
-        "power": ["POWER SUPPLY"],
-        "clean": ["Device Cleaning"],
-        "dock": ["Dock"],
-        "housing": ["Housing"],
-        "glass": ["Glass", "Back Glass"],
-    }
 
-    for keyword, mapped_repairs in SYNONYMS.items():
-        if keyword in text:
-            return mapped_repairs[0]  # return first match
+STORES = StoreRegistry(load_store_configs(), load_store_context)
 
-    return "UNKNOWN"
 
-def send_appointment_link(to_number: str):
+async def send_appointment_link(to_number: str, twilio_number: str = None):
     try:
-        account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-        auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-        twilio_number = os.getenv("TWILIO_PHONE_NUMBER")
+        twilio_number = twilio_number or os.getenv("TWILIO_PHONE_NUMBER")
         appointment_link = os.getenv("APPOINTMENT_LINK")  # fixed typo
 
-        if not all([account_sid, auth_token, twilio_number, appointment_link]):
+        if not all([twilio_number, appointment_link]):
             raise ValueError("Missing one or more required environment variables.")
 
-        client = Client(account_sid, auth_token)
-
-        message = client.messages.create(
-            body=f"Thank you for calling! You can book your appointment here: {appointment_link}",
+        return await twilio_client.send_sms(
+            to=to_number,
             from_=twilio_number,
-            to=to_number
+            body=f"Thank you for calling! You can book your appointment here: {appointment_link}",
         )
 
-        return message.sid
-
     except TwilioRestException as e:
         print(f"Twilio API error: {e}")
         return None
@@ -359,139 +317,251 @@ def send_appointment_link(to_number: str):
         return None
 
 async def start_call_recording(call_sid: str):
-    """Start full-call recording safely in a background thread."""
-    twilio_client = Client(
-        os.getenv("TWILIO_ACCOUNT_SID"),
-        os.getenv("TWILIO_AUTH_TOKEN")
-    )
-
+    """Start full-call recording on the shared Twilio client."""
     try:
-        # Wrap sync Twilio API call in asyncio.to_thread
-        await asyncio.to_thread(
-            lambda: twilio_client.calls(call_sid).recordings.create(
-                recording_channels="dual",  # records both sides
-                recording_status_callback=f"{PUBLIC_URL}/recording-status",
-                recording_status_callback_method="POST",
-                recording_status_callback_event=["in-progress", "completed"]
-            )
+        await twilio_client.start_recording(
+            call_sid,
+            recording_channels="dual",  # records both sides
+            recording_status_callback=f"{PUBLIC_URL}/recording-status",
+            recording_status_callback_method="POST",
+            recording_status_callback_event=["in-progress", "completed"]
         )
         print(f"[RECORDING] Started recording for call {call_sid}")
     except Exception as e:
         print(f"[RECORDING] Failed to start recording for {call_sid}: {e}")
 
-def is_exit_intent(speech: str) -> bool:
-    if not speech:
-        return False
+# ==========================================
+# SHARED TURN LOGIC (/voice + /stream)
+# ==========================================
+
+def new_call_session(from_number: str = None, store_id: str = None) -> dict:
+    return {
+        "messages": [],
+        "phone_number": from_number,
+        "issue": None,
+        "call_type": "AI_RESOLVED",
+        "outcome": "QUOTE_PROVIDED",
+        "store_id": store_id or ID,
+        "started_at": datetime.utcnow(),
+        "audio_url": None,
+        "transcripts": [],
+        "recording_started": False
+    }
 
-    exit_phrases = [
-        "no thank you",
-        "no thanks",
-        "thanks but no thanks",
-        "that's all",
-        "that’s it",
-        "nothing else",
-        "nothing else today",
-        "nothing more",
-        "i'm good",
-        "i’m good thanks",
-        "i'm all set",
-        "i’m all set thanks",
-        "i'm okay",
-        "that’s fine",
-        "that works for me",
-        "that should do it",
-        "that covers it",
-        "that does it",
-        "that'll do",
-        "that sounds good",
-        "sounds good",
-        "thanks",
-        "thank you",
-        "thanks a lot",
-        "thank you so much",
-        "appreciate it",
-        "i appreciate it",
-        "thanks for your help",
-        "thanks for your time",
-        "thanks for the info",
-        "alright thanks",
-        "okay thanks",
-        "ok thanks",
-        "great thanks",
-        "perfect thanks",
-        "that answers my question",
-        "that helps",
-        "that clears it up",
-        "that makes sense",
-        "that explains it",
-        "bye",
-        "goodbye",
-        "have a good day",
-        "have a great day",
-        "talk to you later",
-        "alright bye",
-        "okay bye",
-        "i'll think about it",
-        "i'll get back to you",
-        "that's all i needed"
-    ]
-
-    speech = speech.lower().strip()
-
-    return any(phrase in speech for phrase in exit_phrases)
-
-def download_recording(call_sid: str, recording_url: str):
-    twilio_sid = os.getenv("TWILIO_ACCOUNT_SID")
-    twilio_token = os.getenv("TWILIO_AUTH_TOKEN")
 
+def retrieve_context(speech: str, retriever):
+    """
+    Embed the question once and reuse the vector for both the FAISS search
+    and the semantic answer cache. Returns (context, query_vector).
+    Blocking (the embedding may be a network call): run it in a thread.
+    """
     try:
-        if not recording_url:
-            return
+        vectorstore = retriever.vectorstore
 
-        download_url = f"{recording_url}.mp3"
+        with metrics.stage("embed"):
+            vector = vectorstore.embeddings.embed_query(speech)
 
-        r = requests.get(
-            download_url,
-            auth=(twilio_sid, twilio_token),
-            timeout=20
-        )
-        r.raise_for_status()
+        with metrics.stage("search"):
+            docs = vectorstore.similarity_search_by_vector(
+                vector, k=retriever.search_kwargs.get("k", 3)
+            )
+    except Exception as e:
+        print("❌ RAG ERROR:", e)
+        return "", None
+
+    context = "\n\n".join(
+        [doc.page_content for doc in docs if hasattr(doc, "page_content")]
+    ) if docs else ""
 
-        # Get index of segment
-        segment_index = len(CALL_SESSIONS.get(call_sid, {}).get("recordings", []))
+    return context, vector
 
-        file_path = os.path.join(RECORDINGS_DIR, f"{call_sid}_{segment_index}.mp3")
 
-        with open(file_path, "wb") as f:
-            f.write(r.content)
+# Earlier messages sent with each turn; also part of the answer cache key
+PROMPT_HISTORY_MESSAGES = 10
 
-        print(f"✅ Recording saved: {file_path}")
 
-    except requests.RequestException as e:
-        print(f"❌ Failed to download recording {call_sid}: {e}")
+def prompt_history(call_memory: dict) -> list:
+    return call_memory["messages"][-PROMPT_HISTORY_MESSAGES:]
+
+
+def build_turn_messages(call_memory: dict, speech: str, context: str, system_prompt: str) -> list:
+
+    messages = [{"role": "system", "content": system_prompt}]
+
+    if call_memory["messages"]:
+        messages += prompt_history(call_memory)
+
+    messages.append({
+        "role": "user",
+        "content": f"Retrieved Knowledge:\n{context}\n\nUser Question:\n{speech}"
+    })
+
+    return messages
+
+
+def save_turn(call_memory: dict, speech: str, reply: str):
+
+    call_memory["transcripts"].append(
+        {"speaker": "CUSTOMER", "message": speech}
+    )
+
+    call_memory["transcripts"].append(
+        {"speaker": "AI", "message": reply}
+    )
+
+    call_memory["messages"].append(
+        {"role": "user", "content": speech}
+    )
+
+    call_memory["messages"].append(
+        {"role": "assistant", "content": reply}
+    )
+
+    trim_messages(call_memory)
+
+
+def twiml(content: bytes) -> Response:
+    return Response(content=content, media_type="application/xml")
+
+
+async def store_for_call(to_number: str):
+    """
+    The store context for a dialed number, or None if it isn't configured or
+    is still loading after STORE_LOAD_WAIT_SECONDS.
+    """
+    with metrics.stage("store"):
+        store_id = STORES.route(to_number)
+
+        if store_id is None:
+            print(f"⚠ No store configured for {to_number}")
+            return None
+
+        return await STORES.get(store_id, timeout=STORE_LOAD_WAIT_SECONDS)
 
 
 # ==========================================
 # ROUTES
 # ==========================================
 
+# Twilio webhooks; each response carries a Server-Timing header
+TIMED_ROUTES = {"/", "/voice", "/voice-stream", "/stream-action", "/recording-status", "/recording-complete"}
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+
+    route = request.url.path
+
+    if route not in TIMED_ROUTES:
+        return await call_next(request)
+
+    with metrics.track(route) as timings:
+        response = await call_next(request)
+
+    response.headers["Server-Timing"] = timings.header()
+    return response
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    metrics.SESSIONS_ACTIVE.set((await CALL_SESSIONS.stats())["active"])
+    metrics.STORE_MEMORY_BYTES.set(STORES.memory_estimate())
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/cache-stats")
+def cache_stats():
+    return answer_cache.stats()
+
+@app.get("/outbox-stats")
+async def outbox_stats():
+    return await outbox.stats()
+
+@app.get("/twilio-stats")
+def twilio_stats():
+    return twilio_client.latency_stats()
+
+@app.get("/recording-stats")
+def recording_stats():
+    return recordings.stats()
+
+@app.get("/session-stats")
+async def session_stats():
+    return await CALL_SESSIONS.stats()
+
+@app.get("/store-stats")
+def store_stats():
+    return STORES.stats()
+
+@app.get("/ready")
+def ready():
+    # Other stores load on their first call; only the .env store gates readiness
+    store = STORES.default
+
+    if store is None:
+        return {"status": "ready", "stores": len(STORES.configs)}
+
+    snapshot = store.index.get_snapshot()
+
+    checks = {
+        "behavior": bool(store.behavior),
+        "rag": snapshot.retriever is not None,
+    }
+
+    if not all(checks.values()):
+        return JSONResponse(status_code=503, content={"status": "starting", **checks})
+
+    return {"status": "ready", "rag_generation": snapshot.generation}
+
+
+async def initialize():
+    """
+    Load the default store up front, retrying only the part (behavior or
+    index) that failed. /ready reports 503 until both are in.
+    """
+    store = STORES.default
+
+    if store is None:
+        return
+
+    started = time.perf_counter()
+
+    while True:
+        try:
+            await load_store_context(store)
+        except Exception as e:
+            print("RAG failed:", e)
+
+        if store.behavior and store.index.get_snapshot().retriever is not None:
+            break
+
+        print(f"⏳ Default store not ready, retrying in {STARTUP_RETRY_SECONDS:.0f}s")
+        await asyncio.sleep(STARTUP_RETRY_SECONDS)
+
+    print("✅ RAG ready")
+    print(f"✅ Initialized in {time.perf_counter() - started:.2f}s")
+
+
 @app.on_event("startup")
 async def startup():
-    global retriever, behavior_data
     asyncio.create_task(cleanup_sessions())
     print("🚀 Server starting...")
-    behavior_data = load_ai_behavior()
-    print("AI Behavior Loaded")
-    try:
-      retriever = load_or_build_vectorstore()
-      print("✅ RAG ready")
-    except Exception as e:
-      print("RAG failed:", e)
-      retriever = None    
+    asyncio.create_task(llm.warmup())
+    outbox.start()
+    recordings.cleanup_partials()
+    if WORKER_SYNC_SECONDS > 0:
+        asyncio.create_task(sync_workers())
+    app.state.init_task = asyncio.create_task(initialize())
+
+@app.on_event("shutdown")
+async def shutdown():
+    await llm.close()
+    await outbox.stop()
+    await auth.aclose()
+    await twilio_client.close()
+    await recordings.close()
+    call_log.close()
 
 @app.post("/")
 async def root(request: Request, background_tasks: BackgroundTasks):
@@ -500,337 +570,476 @@ async def root(request: Request, background_tasks: BackgroundTasks):
 @app.post("/voice")
 async def voice(request: Request, background_tasks: BackgroundTasks):
 
+    call_sid = None
+
     try:
 
-        form = await request.form()
-        form_data = dict(form)
+        with metrics.stage("parse"):
+            form = await request.form()
+            form_data = dict(form)
 
         speech = form_data.get("SpeechResult", "").strip()
         call_sid = form_data.get("CallSid")
         from_number = form_data.get("From")
 
-        response = VoiceResponse()
-
         # ---------------- CallSid safety ----------------
         if not call_sid:
-            response.say("Call error occurred.", voice="alice")
-            return Response(content=str(response), media_type="application/xml")
+            return twiml(CALL_ERROR_TWIML)
 
-        # ---------------- CLEAN OLD SESSIONS ----------------
-        threshold = datetime.utcnow() - timedelta(hours=1)
+        # ---------------- Route by dialed number ----------------
+        store = await store_for_call(form_data.get("To"))
 
-        global CALL_SESSIONS
-        CALL_SESSIONS = {
-            k: v for k, v in CALL_SESSIONS.items()
-            if v.get("started_at") and v["started_at"] > threshold
-        }
+        if store is None:
+            return twiml(INITIALIZING_TWIML)
+
+        # One behavior snapshot per turn, like the RAG snapshot below
+        behavior_snapshot = store.behavior
 
         # ---------------- Initialize call session ----------------
-        if call_sid not in CALL_SESSIONS:
-
-            CALL_SESSIONS[call_sid] = {
-                "messages": [],
-                "phone_number": from_number,
-                "issue": None,
-                "call_type": "AI_RESOLVED",
-                "outcome": "QUOTE_PROVIDED",
-                "store_id": ID,
-                "started_at": datetime.utcnow(),
-                "audio_url": None,
-                "transcripts": [],
-                "recording_started": False
-            }
+        # Held for the whole turn so a second worker can't interleave writes
+        async with session_scope(CALL_SESSIONS, call_sid, lambda: new_call_session(from_number, store.store_id)) as call_memory:
 
-        call_memory = CALL_SESSIONS[call_sid]
+            # ---------------- First greeting ----------------
+            if not speech:
 
-        # ---------------- First greeting ----------------
-        if not speech:
+                if behavior_snapshot.is_open():
 
-            open_status = is_business_open(behavior_data)
-            greetings = behavior_data.get("greetings", {})
+                    call_memory["transcripts"].append(
+                        {"speaker": "AI", "message": behavior_snapshot.greeting}
+                    )
 
-            if open_status:
+                    return twiml(behavior_snapshot.greeting_twiml)
 
-                greeting = greetings.get("opening_hours_greeting", "")
-                greeting = greeting.replace("{store_name}", STORE_NAME)
+                else:
 
-                response.pause(length=1)
-                response.say(greeting, voice="alice", language="en-US")
+                    call_memory["call_type"] = "DROPPED"
+                    call_memory["outcome"] = "CALL_DROPPED"
 
-                gather = Gather(
-                    input="speech",
-                    action=f"{PUBLIC_URL}/voice",
-                    method="POST",
-                    timeout=15,
-                    speechTimeout="auto",
-                    language="en-US",
-                    speechModel="phone_call"
-                )
+                    call_memory["transcripts"].append(
+                        {"speaker": "AI", "message": behavior_snapshot.closed_message}
+                    )
 
-                response.append(gather)
+                    background_tasks.add_task(send_call_log, call_sid)
 
-                # fallback if user silent
-                response.say(
-                    "Sorry, I didn't catch that. Could you repeat?",
-                    voice="alice"
-                )
+                    return twiml(behavior_snapshot.closed_twiml)
+
+            # ---------------- Start recording ----------------
+            if speech and not call_memory.get("recording_started"):
+                call_memory["recording_started"] = True
+                background_tasks.add_task(start_call_recording, call_sid)
+
+            # ---------------- Detect intents (one pass) ----------------
+            with metrics.stage("intents"):
+                intents = store.intent_matcher.match(speech)
 
-                response.redirect(f"{PUBLIC_URL}/voice")
+            if not call_memory["issue"]:
+                call_memory["issue"] = intents.issue
+
+            # ---------------- Exit intent ----------------
+            if intents.exit:
 
                 call_memory["transcripts"].append(
-                    {"speaker": "AI", "message": greeting}
+                    {"speaker": "CUSTOMER", "message": speech}
+                )
+                call_memory["transcripts"].append(
+                    {"speaker": "AI", "message": behavior_snapshot.closing_message}
                 )
 
-                return Response(content=str(response), media_type="application/xml")
+                call_memory["call_type"] = "AI_RESOLVED"
+                call_memory["outcome"] = "QUOTE_PROVIDED"
 
-            else:
+                background_tasks.add_task(send_call_log, call_sid)
 
-                closed_msg = greetings.get(
-                    "closed_hours_message", "We are closed."
-                )
+                return twiml(behavior_snapshot.closing_twiml)
 
-                call_memory["call_type"] = "DROPPED"
-                call_memory["outcome"] = "CALL_DROPPED"
+            # ---------------- Manager transfer ----------------
+            if intents.transfer and behavior_snapshot.transfer_twiml:
+
+                call_memory["call_type"] = "WARM_TRANSFER"
+                call_memory["outcome"] = "ESCALATED"
+
+                call_memory["transcripts"].append(
+                    {"speaker": "CUSTOMER", "message": speech}
+                )
 
                 call_memory["transcripts"].append(
-                    {"speaker": "AI", "message": closed_msg}
+                    {"speaker": "AI", "message": TRANSFER_MESSAGE}
                 )
 
                 background_tasks.add_task(send_call_log, call_sid)
 
-                response.say(closed_msg, voice="alice")
-                response.hangup()
+                return twiml(behavior_snapshot.transfer_twiml)
+
+            # ---------------- Appointment booking ----------------
+            if intents.booking:
 
-                return Response(content=str(response), media_type="application/xml")
+                call_memory["call_type"] = "APPOINTMENT"
+                call_memory["outcome"] = "APPOINTMENT_BOOKED"
 
-        # ---------------- Start recording ----------------
-        if speech and not call_memory.get("recording_started"):
-            call_memory["recording_started"] = True
-            background_tasks.add_task(start_call_recording, call_sid)
+                call_memory["transcripts"].append(
+                    {"speaker": "CUSTOMER", "message": speech}
+                )
 
-        # ---------------- Detect issue ----------------
-        if not call_memory["issue"]:
-            call_memory["issue"] = detect_issue(speech)
+                call_memory["transcripts"].append(
+                    {"speaker": "AI", "message": BOOKING_MESSAGE}
+                )
 
-        lower_speech = speech.lower()
+                background_tasks.add_task(send_appointment_link, call_memory["phone_number"], store.config.sms_number)
 
-        # ---------------- Exit intent ----------------
-        if is_exit_intent(speech):
+                background_tasks.add_task(send_call_log, call_sid)
 
-            closing_message = f"Thank you for calling {STORE_NAME}. Have a great day."
+                return twiml(behavior_snapshot.booking_twiml)
 
-            response.say(closing_message, voice="alice")
+            # ---------------- Direct price lookup ----------------
+            # One snapshot per turn so a concurrent /update-rag can't mix indexes
+            rag_snapshot = store.index.get_snapshot()
 
-            call_memory["transcripts"].append(
-                {"speaker": "CUSTOMER", "message": speech}
-            )
-            call_memory["transcripts"].append(
-                {"speaker": "AI", "message": closing_message}
-            )
+            with metrics.stage("price"):
+                reply = rag_snapshot.price_index.quote(speech)
 
-            call_memory["call_type"] = "AI_RESOLVED"
-            call_memory["outcome"] = "QUOTE_PROVIDED"
+            # ---------------- RAG Retrieval ----------------
+            if reply is None and rag_snapshot.retriever is None:
 
-            response.hangup()
+                call_memory["call_type"] = "DROPPED"
+                call_memory["outcome"] = "CALL_DROPPED"
 
-            background_tasks.add_task(send_call_log, call_sid)
+                background_tasks.add_task(send_call_log, call_sid)
 
-            return Response(content=str(response), media_type="application/xml")
+                return twiml(behavior_snapshot.initializing_twiml)
 
-        # ---------------- Manager transfer ----------------
-        for item in behavior_data.get("auto_transfer_keywords", []):
+            if reply is None:
 
-            keyword = item.get("keyword", "").lower()
+                context, query_vector = await asyncio.to_thread(retrieve_context, speech, rag_snapshot.retriever)
 
-            if keyword and keyword in lower_speech:
+                with metrics.stage("cache"):
+                    reply = answer_cache.get(speech, context, query_vector, scope=store.store_id, history=prompt_history(call_memory))
 
-                manager_number = os.getenv("MANAGER_NUMBER")
+            if reply is None:
 
-                if manager_number:
+                # ---------------- AI Prompt ----------------
+                messages = build_turn_messages(call_memory, speech, context, behavior_snapshot.system_prompt)
 
-                    call_memory["call_type"] = "WARM_TRANSFER"
-                    call_memory["outcome"] = "ESCALATED"
+                # ---------------- AI Call ----------------
+                try:
+                    with metrics.stage("llm"):
+                        reply = await llm.chat_completion(messages)
+                    answer_cache.put(speech, context, reply, query_vector, scope=store.store_id, history=prompt_history(call_memory))
+                except asyncio.TimeoutError:
+                    print("⚠ LLM deadline exceeded for", call_sid)
+                    reply = "Sorry, could you say that one more time?"
 
-                    call_memory["transcripts"].append(
-                        {"speaker": "CUSTOMER", "message": speech}
-                    )
+            # ---------------- Save transcript ----------------
+            save_turn(call_memory, speech, reply)
 
-                    call_memory["transcripts"].append(
-                        {"speaker": "AI", "message": "Connecting you to a human agent."}
-                    )
+            print("🤖 AI reply:", reply)
 
-                    response.say(
-                        "Connecting you to a human agent.",
-                        voice="alice"
-                    )
+            # ---------------- Reply and continue listening ----------------
+            with metrics.stage("render"):
+                content = behavior_snapshot.reply_twiml(reply)
 
-                    response.dial(manager_number, timeout=20)
+            return twiml(content)
 
-                    background_tasks.add_task(send_call_log, call_sid)
+    except Exception as e:
 
-                    return Response(content=str(response), media_type="application/xml")
+        print("❌ ERROR:", e)
 
-        # ---------------- Appointment booking ----------------
-        if any(word in lower_speech for word in ["appointment", "book", "schedule"]):
+        if call_sid and await mark_dropped(call_sid):
+            background_tasks.add_task(send_call_log, call_sid)
 
-            call_memory["call_type"] = "APPOINTMENT"
-            call_memory["outcome"] = "APPOINTMENT_BOOKED"
+        return twiml(SERVER_ERROR_TWIML)
 
-            message = "Thank you! I have sent the appointment link."
+# ==========================================
+# STREAMING CONVERSATION (ConversationRelay)
+# ==========================================
 
-            response.say(message, voice="alice")
+@app.post("/voice-stream")
+async def voice_stream(request: Request, background_tasks: BackgroundTasks):
 
-            call_memory["transcripts"].append(
-                {"speaker": "CUSTOMER", "message": speech}
-            )
+    form = await request.form()
+    call_sid = form.get("CallSid")
+    from_number = form.get("From")
 
-            call_memory["transcripts"].append(
-                {"speaker": "AI", "message": message}
-            )
+    if not call_sid:
+        return twiml(CALL_ERROR_TWIML)
 
-            response.hangup()
+    store = await store_for_call(form.get("To"))
 
-            try:
-                send_appointment_link(call_memory["phone_number"])
-            except Exception as e:
-                print("❌ Failed sending appointment link:", e)
+    if store is None:
+        return twiml(INITIALIZING_TWIML)
 
-            background_tasks.add_task(send_call_log, call_sid)
+    behavior_snapshot = store.behavior
 
-            return Response(content=str(response), media_type="application/xml")
+    async with session_scope(CALL_SESSIONS, call_sid, lambda: new_call_session(from_number, store.store_id)) as call_memory:
 
-        # ---------------- RAG Retrieval ----------------
-        if retriever is None:
+        if not behavior_snapshot.is_open():
 
             call_memory["call_type"] = "DROPPED"
             call_memory["outcome"] = "CALL_DROPPED"
+            call_memory["transcripts"].append({"speaker": "AI", "message": behavior_snapshot.closed_message})
 
             background_tasks.add_task(send_call_log, call_sid)
 
-            response.say(
-                "System is initializing. Please try again shortly.",
-                voice="alice"
-            )
+            return twiml(behavior_snapshot.closed_twiml)
 
-            response.hangup()
+        call_memory["transcripts"].append({"speaker": "AI", "message": behavior_snapshot.greeting})
 
-            return Response(content=str(response), media_type="application/xml")
+        return twiml(behavior_snapshot.stream_twiml)
 
-        try:
-            docs = retriever.invoke(speech)
-        except Exception as e:
-            print("❌ RAG ERROR:", e)
-            docs = []
-
-        context = "\n\n".join(
-            [doc.page_content for doc in docs if hasattr(doc, "page_content")]
-        ) if docs else ""
-
-        # ---------------- AI Prompt ----------------
-        tone = behavior_data.get("tone", "friendly")
-
-        system_behavior = f"""
-You are a retail call assistant for {STORE_NAME}.
-Tone: {tone}
-
-Rules:
-- Answer ONLY from retrieved knowledge.
-- Keep responses short and voice-friendly.
-- If unsure, ask again.
-"""
-
-        messages = [{"role": "system", "content": system_behavior}]
-
-        if call_memory["messages"]:
-            messages += call_memory["messages"][-10:]
-
-        messages.append({
-            "role": "user",
-            "content": f"Retrieved Knowledge:\n{context}\n\nUser Question:\n{speech}"
-        })
-
-        # ---------------- AI Call ----------------
-        ai_response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.2,
-            max_tokens=60,
-            timeout=20
-        )
 
-        reply = ai_response.choices[0].message.content.strip()
+async def send_stream_text(websocket: WebSocket, text: str, last: bool):
+    await websocket.send_json({"type": "text", "token": text, "last": last})
 
-        # ---------------- Save transcript ----------------
-        call_memory["transcripts"].append(
-            {"speaker": "CUSTOMER", "message": speech}
-        )
 
-        call_memory["transcripts"].append(
-            {"speaker": "AI", "message": reply}
-        )
+async def end_stream(websocket: WebSocket, reason: str):
+    await websocket.send_json({"type": "end", "handoffData": json.dumps({"reason": reason})})
 
-        call_memory["messages"].append(
-            {"role": "user", "content": speech}
-        )
 
-        call_memory["messages"].append(
-            {"role": "assistant", "content": reply}
-        )
+async def handle_stream_turn(websocket: WebSocket, store, call_sid: str, speech: str, call_memory: dict) -> bool:
+    """
+    Run one caller turn over the relay socket. Returns True once the call is over.
+    """
+    behavior_snapshot = store.behavior
 
-        print("🤖 AI reply:", reply)
+    if not call_memory.get("recording_started"):
+        call_memory["recording_started"] = True
+        asyncio.create_task(start_call_recording(call_sid))
 
-        response.pause(length=1)
-        response.say(reply, voice="alice", language="en-US")
+    with metrics.stage("intents"):
+        intents = store.intent_matcher.match(speech)
 
-        # ---------------- Continue listening ----------------
-        gather = Gather(
-            input="speech",
-            action=f"{PUBLIC_URL}/voice",
-            method="POST",
-            timeout=15,
-            speechTimeout="auto",
-            language="en-US",
-            speechModel="phone_call"
-        )
+    if not call_memory["issue"]:
+        call_memory["issue"] = intents.issue
 
-        response.append(gather)
+    if intents.exit:
 
-        response.say(
-            "Sorry, I didn't catch that. Could you repeat?",
-            voice="alice"
-        )
+        closing_message = behavior_snapshot.closing_message
+
+        call_memory["transcripts"].append({"speaker": "CUSTOMER", "message": speech})
+        call_memory["transcripts"].append({"speaker": "AI", "message": closing_message})
+        call_memory["call_type"] = "AI_RESOLVED"
+        call_memory["outcome"] = "QUOTE_PROVIDED"
+
+        await send_stream_text(websocket, closing_message, last=True)
+        await end_stream(websocket, "hangup")
+        return True
+
+    if intents.transfer and behavior_snapshot.transfer_twiml:
+
+        call_memory["call_type"] = "WARM_TRANSFER"
+        call_memory["outcome"] = "ESCALATED"
+        call_memory["transcripts"].append({"speaker": "CUSTOMER", "message": speech})
+        call_memory["transcripts"].append({"speaker": "AI", "message": TRANSFER_MESSAGE})
+
+        await send_stream_text(websocket, TRANSFER_MESSAGE, last=True)
+        await end_stream(websocket, "transfer")
+        return True
 
-        response.redirect(f"{PUBLIC_URL}/voice")
+    if intents.booking:
 
-        return Response(content=str(response), media_type="application/xml")
+        call_memory["call_type"] = "APPOINTMENT"
+        call_memory["outcome"] = "APPOINTMENT_BOOKED"
+
+        call_memory["transcripts"].append({"speaker": "CUSTOMER", "message": speech})
+        call_memory["transcripts"].append({"speaker": "AI", "message": BOOKING_MESSAGE})
+
+        await send_stream_text(websocket, BOOKING_MESSAGE, last=True)
+
+        asyncio.create_task(send_appointment_link(call_memory["phone_number"], store.config.sms_number))
+
+        await end_stream(websocket, "hangup")
+        return True
+
+    rag_snapshot = store.index.get_snapshot()
+
+    with metrics.stage("price"):
+        quote = rag_snapshot.price_index.quote(speech)
+
+    if quote is not None:
+        await send_stream_text(websocket, quote, last=True)
+        save_turn(call_memory, speech, quote)
+        print("🤖 AI reply (price index):", quote)
+        return False
+
+    if rag_snapshot.retriever is None:
+
+        call_memory["call_type"] = "DROPPED"
+        call_memory["outcome"] = "CALL_DROPPED"
+
+        await send_stream_text(websocket, INITIALIZING_MESSAGE, last=True)
+        await end_stream(websocket, "hangup")
+        return True
+
+    context, query_vector = await asyncio.to_thread(retrieve_context, speech, rag_snapshot.retriever)
+
+    with metrics.stage("cache"):
+        reply = answer_cache.get(speech, context, query_vector, scope=store.store_id, history=prompt_history(call_memory))
+
+    if reply is not None:
+        await send_stream_text(websocket, reply, last=True)
+        save_turn(call_memory, speech, reply)
+        print("🤖 AI reply (cached):", reply)
+        return False
+
+    messages = build_turn_messages(call_memory, speech, context, behavior_snapshot.system_prompt)
+
+    sentences = []
+    timed_out = False
+
+    try:
+        with metrics.stage("llm"):
+            async for sentence in llm.stream_sentences(messages):
+                sentences.append(sentence)
+                await send_stream_text(websocket, sentence + " ", last=False)
+    except asyncio.TimeoutError:
+        print("⚠ LLM deadline exceeded for", call_sid)
+        timed_out = True
+        if not sentences:
+            sentences.append("Sorry, could you say that one more time?")
+            await send_stream_text(websocket, sentences[-1], last=False)
+
+    await send_stream_text(websocket, "", last=True)
+
+    reply = " ".join(sentences)
+
+    if not timed_out:
+        answer_cache.put(speech, context, reply, query_vector, scope=store.store_id, history=prompt_history(call_memory))
+
+    save_turn(call_memory, speech, reply)
+    print("🤖 AI reply:", reply)
+
+    return False
+
+
+@app.websocket("/stream")
+async def stream(websocket: WebSocket):
+
+    await websocket.accept()
+    metrics.STREAMS_OPEN.inc()
+    call_sid = None
+    store = None
+
+    try:
+        while True:
+            message = await websocket.receive_json()
+            kind = message.get("type")
+
+            if kind == "setup":
+                call_sid = message.get("callSid")
+                from_number = message.get("from")
+                store = await store_for_call(message.get("to"))
+
+                if store is None:
+                    await send_stream_text(websocket, INITIALIZING_MESSAGE, last=True)
+                    await end_stream(websocket, "hangup")
+                    break
+
+                async with session_scope(CALL_SESSIONS, call_sid, lambda: new_call_session(from_number, store.store_id)):
+                    pass
+                print(f"[STREAM] Connected {call_sid} (store {store.store_id})")
+
+            elif kind == "prompt" and call_sid:
+                speech = (message.get("voicePrompt") or "").strip()
+
+                if not speech:
+                    continue
+
+                with metrics.track("/stream"):
+                    async with session_scope(CALL_SESSIONS, call_sid, lambda: new_call_session(store_id=store.store_id)) as call_memory:
+                        finished = await handle_stream_turn(websocket, store, call_sid, speech, call_memory)
+
+                if finished:
+                    break
+
+            elif kind == "interrupt":
+                print(f"[STREAM] Caller interrupted {call_sid}")
+
+            elif kind == "error":
+                print(f"[STREAM] Relay error {call_sid}: {message.get('description')}")
+
+    except WebSocketDisconnect:
+        print(f"[STREAM] Disconnected {call_sid}")
 
     except Exception as e:
+        print("❌ STREAM ERROR:", e)
 
-        print("❌ ERROR:", e)
+        if call_sid:
+            await mark_dropped(call_sid)
+
+    finally:
+        metrics.STREAMS_OPEN.dec()
 
-        if call_sid in CALL_SESSIONS:
-            CALL_SESSIONS[call_sid]["call_type"] = "DROPPED"
-            CALL_SESSIONS[call_sid]["outcome"] = "CALL_DROPPED"
-            background_tasks.add_task(send_call_log, call_sid)
 
-        response = VoiceResponse()
-        response.say("Sorry. There was a server error.", voice="alice")
+@app.post("/stream-action")
+async def stream_action(request: Request, background_tasks: BackgroundTasks):
+    """
+    Twilio calls this once the relay session ends (hangup, transfer or drop).
+    """
+    form = await request.form()
+    call_sid = form.get("CallSid")
+
+    try:
+        handoff = json.loads(form.get("HandoffData") or "{}")
+    except ValueError:
+        handoff = {}
+
+    session = await CALL_SESSIONS.load(call_sid) if call_sid else None
+
+    # The transfer goes to the manager of the store the caller dialed
+    config = STORES.configs.get((session or {}).get("store_id"))
+    manager_number = config.manager_number if config else os.getenv("MANAGER_NUMBER")
+
+    response = VoiceResponse()
+
+    if handoff.get("reason") == "transfer" and manager_number:
+        response.dial(manager_number, timeout=20)
+    else:
         response.hangup()
 
-        return Response(content=str(response), media_type="application/xml")
+    if session is not None:
+        background_tasks.add_task(send_call_log, call_sid)
+
+    return Response(content=str(response), media_type="application/xml")
 
 # ==========================================
 # SYSTEM UPDATE ENDPOINT
 # ==========================================
 
+def stores_to_update(store_id) -> list:
+    """
+    The one store asked for, else every configured store.
+    """
+    if store_id is None:
+        return list(STORES.configs)
+
+    if store_id not in STORES.configs:
+        raise HTTPException(status_code=404, detail=f"Unknown store {store_id}")
+
+    return [store_id]
+
+
 @app.post("/update-system")
-async def update_system(): 
-    global behavior_data
+async def update_system(store_id: str = None):
+    store_ids = stores_to_update(store_id)
+    # None (every store) clears the whole answer cache
+    scope = store_id
 
     try:
-        behavior_data = load_ai_behavior()
-        print("System update endpoint got hit.")
-        print(get_dynamic_hours(behavior_data))
+        # Stores that aren't loaded anywhere fetch fresh behavior when they load;
+        # the stamp tells sibling workers that have them loaded
+        for store_id in store_ids:
+            stamp = touch_behavior_stamp(behavior_stamp_path(store_id))
+            store = STORES.peek(store_id)
+
+            if store is None:
+                continue
+
+            store.behavior = await asyncio.to_thread(fetch_behavior, store.config)
+            store.behavior_stamp = stamp
+            store.refresh_intents()
+            print(f"System update endpoint got hit (store {store_id}).")
+            print(store.behavior.hours_text)
+
+        answer_cache.invalidate("behavior updated", scope=scope)
 
         return {
             "status": "success",
@@ -849,11 +1058,29 @@ async def update_system():
 # ==========================================
 
 
+async def rebuild_store(store_id: str):
+    store = await STORES.get(store_id)
+
+    if store is not None:
+        await rebuild_vectorstore_safe(store)
+
+
 @app.post("/update-rag")
-async def update_rag(background_tasks: BackgroundTasks):
+async def update_rag(background_tasks: BackgroundTasks, store_id: str = None):
+    store_ids = stores_to_update(store_id)
+
     try:
-        background_tasks.add_task(rebuild_vectorstore_safe)
-        print("RAG update endpoint got hit.")
+        # Every store asked for is marked stale: stores loaded in other workers
+        # rebuild on their next sync, unloaded ones when they next load
+        for stale_id in store_ids:
+            rag.mark_stale(stale_id)
+
+        if store_id is None:
+            store_ids = [store.store_id for store in STORES.loaded()]
+
+        for store_id in store_ids:
+            background_tasks.add_task(rebuild_store, store_id)
+        print(f"RAG update endpoint got hit ({len(store_ids)} stores rebuilding here).")
 
         return {
             "status": "success",
@@ -876,19 +1103,26 @@ async def recording_status(request: Request, background_tasks: BackgroundTasks):
     form = await request.form()
     call_sid = form.get("CallSid")
     recording_url = form.get("RecordingUrl")
+    recording_status = form.get("RecordingStatus")
 
-    print(f"Recording callback: {call_sid} -> {recording_url}")
+    print(f"Recording callback: {call_sid} -> {recording_url} ({recording_status})")
 
-    if not recording_url:
+    # "in-progress" callbacks point at audio that isn't finished yet
+    if not recording_url or recording_status not in (None, "completed"):
         return PlainTextResponse("OK")
 
-    if call_sid not in CALL_SESSIONS:
-        CALL_SESSIONS[call_sid] = {"recordings": []}
+    # The call may not have a session yet; keep a stub that /voice fills in later
+    async with session_scope(CALL_SESSIONS, call_sid, lambda: {"recordings": []}) as session:
+        urls = session["recordings"]
+
+        # Twilio retries callbacks; a repeat keeps its original segment number
+        if recording_url not in urls:
+            urls.append(recording_url)
 
-    CALL_SESSIONS[call_sid].setdefault("recordings", []).append(recording_url)
+        segment_index = urls.index(recording_url) + 1
 
     # Run the download in background (non-blocking)
-    background_tasks.add_task(download_recording, call_sid, recording_url)
+    background_tasks.add_task(recordings.download_recording, call_sid, recording_url, segment_index)
 
     # Respond immediately to Twilio
     return PlainTextResponse("OK")
@@ -900,39 +1134,34 @@ async def recording_status(request: Request, background_tasks: BackgroundTasks):
 
 
 @app.post("/recording-complete")
-async def recording_complete(request: Request):
+async def recording_complete(request: Request, background_tasks: BackgroundTasks):
     form = await request.form()
     call_sid = form.get("CallSid")
     print(f"[COMPLETE] Recording complete for {call_sid}")
 
-    if call_sid not in CALL_SESSIONS:
+    session = await CALL_SESSIONS.load(call_sid)
+
+    if session is None:
         print(f"No session found for {call_sid}")
-        return "", 200
+        return PlainTextResponse("OK")
 
-    segments = CALL_SESSIONS[call_sid].get("recordings", [])
+    segments = session.get("recordings", [])
     if not segments:
         print(f"No segments found for {call_sid}")
-        return "", 200
-
-    # Wait for all segments to be downloaded
-    combined = AudioSegment.empty()
-    for idx, _ in enumerate(segments, start=1):
-        file_path = os.path.join(RECORDINGS_DIR, f"{call_sid}_{idx}.mp3")
-        wait_time = 0
-        while not os.path.exists(file_path) and wait_time < 10:
-            time.sleep(0.5)  # wait until download finishes
-            wait_time += 0.5
-
-        if os.path.exists(file_path):
-            combined += AudioSegment.from_mp3(file_path)
-        else:
-            print(f"❌ Segment {idx} for {call_sid} not found, skipping")
-
-    # Export full call
-    full_file = os.path.join(RECORDINGS_DIR, f"{call_sid}_full.mp3")
-    combined.export(full_file, format="mp3")
-    CALL_SESSIONS[call_sid]["audio_url"] = full_file
-
-    print(f"✅ Full call recording saved as {full_file}")
-
-    return "", 200
+        return PlainTextResponse("OK")
+
+    # Merge starts once the downloads land; Twilio gets its answer now
+    background_tasks.add_task(finish_call_recording, call_sid, len(segments))
+
+    return PlainTextResponse("OK")
+
+
+async def finish_call_recording(call_sid: str, segment_count: int):
+    full_file = await recordings.merge_call_recording(call_sid, segment_count)
+
+    if full_file is None:
+        return
+
+    async with session_scope(CALL_SESSIONS, call_sid) as session:
+        if session is not None:
+            session["audio_url"] = full_file
@@ -0,0 +1,314 @@
+import os
+import time
+import logging
+import bisect
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ==========================================
+# ENV VARIABLES
+# ==========================================
+# Turns slower than this are counted and have their stage breakdown logged
+SLOW_TURN_SECONDS = float(os.getenv("SLOW_TURN_SECONDS", "5"))
+# At most one slow-turn log line per this many seconds; the rest are counted
+SLOW_TURN_LOG_SECONDS = float(os.getenv("SLOW_TURN_LOG_SECONDS", "10"))
+
+# Seconds; the top bucket is Twilio's 15s webhook budget
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 15)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry = []
+
+logger = logging.getLogger(__name__)
+
+_slow_lock = threading.Lock()
+_slow_logged_at = float("-inf")
+_slow_suppressed = 0
+
+
+# ==========================================
+# METRIC TYPES
+# ==========================================
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    @abstractmethod
+    def _samples(self):
+        """
+        Exposition lines for every label set; called with _lock held.
+        """
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines += self._samples()
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """
+    Cumulative buckets, rendered the way Prometheus expects:
+    <name>_bucket{le=...}, <name>_sum and <name>_count per label set.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * len(self.buckets), 0.0]
+
+            counts[0][bisect.bisect_left(self.buckets, value)] += 1
+            counts[1] += value
+
+    def _samples(self):
+        lines = []
+
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+
+        return lines
+
+
+def render() -> str:
+    """
+    Every registered metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _registry:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# ==========================================
+# HOT-PATH METRICS
+# ==========================================
+REQUEST_SECONDS = Histogram(
+    "voice_request_seconds", "Webhook handling time, from request to response headers.", ["route"]
+)
+STAGE_SECONDS = Histogram(
+    "voice_stage_seconds", "Time spent in each stage of a turn.", ["stage"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "voice_requests_in_flight", "Webhooks and relay turns currently being handled.", ["route"]
+)
+STREAMS_OPEN = Gauge(
+    "voice_streams_open", "Open ConversationRelay websockets."
+)
+SESSIONS_ACTIVE = Gauge(
+    "voice_sessions_active", "Live call sessions in the session backend."
+)
+SLOW_REQUESTS = Counter(
+    "voice_slow_requests_total", "Requests slower than SLOW_TURN_SECONDS.", ["route"]
+)
+
+LLM_REQUESTS = Counter(
+    "llm_requests_total", "Chat completions by mode and outcome.", ["mode", "outcome"]
+)
+LLM_SECONDS = Histogram(
+    "llm_request_seconds", "Chat completion time, including the wait for a slot.", ["mode", "outcome"]
+)
+LLM_QUEUE_SECONDS = Histogram(
+    "llm_queue_seconds", "Time spent waiting for an LLM concurrency slot."
+)
+LLM_FIRST_TOKEN_SECONDS = Histogram(
+    "llm_first_token_seconds", "Time to the first streamed token."
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Tokens reported by the API.", ["kind"]
+)
+LLM_IN_FLIGHT = Gauge(
+    "llm_requests_in_flight", "Chat completions holding a concurrency slot."
+)
+
+STORES_LOADED = Gauge(
+    "stores_loaded", "Store contexts resident in this process."
+)
+STORE_MEMORY_BYTES = Gauge(
+    "store_memory_bytes", "Estimated memory held by loaded store indexes."
+)
+STORE_LOADS = Counter(
+    "store_loads_total", "Lazy store context loads by outcome.", ["outcome"]
+)
+STORE_LOAD_SECONDS = Histogram(
+    "store_load_seconds", "Time to load a store's behavior and index."
+)
+STORE_EVICTIONS = Counter(
+    "store_evictions_total", "Store contexts evicted to stay under the memory budget."
+)
+
+
+# ==========================================
+# PER-REQUEST TIMINGS
+# ==========================================
+class Timings:
+    """
+    Stage durations of one request, in the order they first ran. Repeated
+    stages add up. Rendered as a Server-Timing header.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.total = None
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def finish(self) -> float:
+        self.total = time.perf_counter() - self.started
+        return self.total
+
+    def header(self) -> str:
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        if self.total is not None:
+            parts.append(f"total;dur={self.total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current = ContextVar("metrics_timings", default=None)
+
+
+def record_stage(name: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=name)
+
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a block into voice_stage_seconds and the current request's Timings.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+@contextmanager
+def track(route: str):
+    """
+    Time one request (or relay turn) end to end. Stages timed inside the
+    block, including in tasks started from it, land on the yielded Timings.
+    """
+    timings = Timings()
+    token = _current.set(timings)
+    REQUESTS_IN_FLIGHT.inc(route=route)
+
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+        REQUESTS_IN_FLIGHT.dec(route=route)
+
+        total = timings.finish()
+        REQUEST_SECONDS.observe(total, route=route)
+
+        if total > SLOW_TURN_SECONDS:
+            SLOW_REQUESTS.inc(route=route)
+            _log_slow(route, timings)
+
+
+def _log_slow(route: str, timings: Timings):
+    """
+    Log one slow request's breakdown, at most once per SLOW_TURN_LOG_SECONDS.
+    voice_slow_requests_total has the full count.
+    """
+    global _slow_logged_at, _slow_suppressed
+
+    now = time.monotonic()
+    with _slow_lock:
+        if now - _slow_logged_at < SLOW_TURN_LOG_SECONDS:
+            _slow_suppressed += 1
+            return
+
+        suppressed = _slow_suppressed
+        _slow_logged_at = now
+        _slow_suppressed = 0
+
+    logger.warning(
+        "🐢 Slow %s (%.2fs): %s%s", route, timings.total, timings.header(),
+        f" (+{suppressed} more since the last report)" if suppressed else "",
+    )
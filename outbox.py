@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import asyncio
+from contextlib import closing
+from dotenv import load_dotenv
+from auth import get_async_client
+
+load_dotenv()
+
+# ==========================================
+# ENV VARIABLES
+# ==========================================
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "./cache/outbox.db")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_TIMEOUT = float(os.getenv("OUTBOX_TIMEOUT", "10"))
+OUTBOX_RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE", "2"))
+OUTBOX_RETRY_MAX = float(os.getenv("OUTBOX_RETRY_MAX", "600"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+
+# A claimed row is invisible to other workers/processes for this long
+CLAIM_LEASE_SECONDS = OUTBOX_TIMEOUT * 3
+
+
+class Outbox:
+    """
+    Durable SQLite queue of call logs, drained by one long-lived worker.
+
+    Records survive restarts and backend outages; each is retried with
+    exponential backoff until the backend accepts it. Rows are claimed
+    with a lease, so several uvicorn workers can share one outbox file.
+
+    token_provider is `async (force_refresh=False) -> token`; a 401 makes
+    the next batch ask for a fresh token.
+    """
+
+    def __init__(self, url, token_provider, path=OUTBOX_PATH):
+        self.url = url
+        self.token_provider = token_provider
+        self.path = path
+        self._task = None
+        self._force_refresh = False
+        self._wakeup = asyncio.Event()
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.last_delivery_lag = None
+
+    # ---------------- storage ----------------
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    claimed_until REAL NOT NULL DEFAULT 0,
+                    last_error TEXT
+                )
+                """
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (next_attempt_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def _insert(self, payload):
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute(
+                "INSERT INTO outbox (payload, created_at, next_attempt_at) VALUES (?, ?, ?)",
+                (json.dumps(payload, default=str), now, now),
+            )
+
+    def _claim(self, limit):
+        now = time.time()
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            rows = db.execute(
+                "SELECT id, payload, created_at, attempts FROM outbox "
+                "WHERE next_attempt_at <= ? AND claimed_until <= ? "
+                "ORDER BY id LIMIT ?",
+                (now, now, limit),
+            ).fetchall()
+            db.executemany(
+                "UPDATE outbox SET claimed_until = ? WHERE id = ?",
+                [(now + CLAIM_LEASE_SECONDS, row[0]) for row in rows],
+            )
+            db.execute("COMMIT")
+            return rows
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def _settle(self, done, retry):
+        """
+        done: [id], retry: [(id, attempts, error)]
+        """
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.executemany("DELETE FROM outbox WHERE id = ?", [(row_id,) for row_id in done])
+            db.executemany(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, claimed_until = 0, last_error = ? WHERE id = ?",
+                [
+                    (attempts, now + self._backoff(attempts), error[:500], row_id)
+                    for row_id, attempts, error in retry
+                ],
+            )
+
+    def _counts(self):
+        with closing(self._connect()) as db:
+            depth, oldest = db.execute("SELECT COUNT(*), MIN(created_at) FROM outbox").fetchone()
+        return depth, oldest
+
+    @staticmethod
+    def _backoff(attempts):
+        delay = min(OUTBOX_RETRY_BASE * (2 ** (attempts - 1)), OUTBOX_RETRY_MAX)
+        return delay * random.uniform(0.8, 1.2)
+
+    # ---------------- public API ----------------
+    async def enqueue(self, payload: dict):
+        await asyncio.to_thread(self._insert, payload)
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._init_db()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def stats(self) -> dict:
+        depth, oldest = await asyncio.to_thread(self._counts)
+        return {
+            "queue_depth": depth,
+            "oldest_pending_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "delivered": self.delivered,
+            "failed_attempts": self.failed_attempts,
+            "last_delivery_lag_seconds": self.last_delivery_lag,
+        }
+
+    # ---------------- worker ----------------
+    async def _deliver(self, row, token):
+        row_id, payload, created_at, attempts = row
+
+        try:
+            response = await get_async_client().post(
+                self.url,
+                content=payload,
+                timeout=OUTBOX_TIMEOUT,
+                headers={
+                    "Authorization": f"Bearer {token}",
+                    "Content-Type": "application/json",
+                },
+            )
+            if response.status_code == 401:
+                self._force_refresh = True
+            response.raise_for_status()
+            return row_id, created_at, None
+        except Exception as e:
+            return row_id, created_at, f"{type(e).__name__}: {e}"
+
+    async def _drain_once(self):
+        rows = await asyncio.to_thread(self._claim, OUTBOX_BATCH_SIZE)
+        if not rows:
+            return 0
+
+        token = await self.token_provider(force_refresh=self._force_refresh)
+        self._force_refresh = False
+
+        # Pipelined over the shared keep-alive pool
+        results = await asyncio.gather(*[self._deliver(row, token) for row in rows])
+        attempts = {row[0]: row[3] for row in rows}
+
+        done, retry = [], []
+        now = time.time()
+
+        for row_id, created_at, error in results:
+            if error is None:
+                done.append(row_id)
+                self.delivered += 1
+                self.last_delivery_lag = round(now - created_at, 3)
+            else:
+                retry.append((row_id, attempts[row_id] + 1, error))
+                self.failed_attempts += 1
+                print(f"⚠ Call log delivery failed (attempt {attempts[row_id] + 1}): {error}")
+
+        await asyncio.to_thread(self._settle, done, retry)
+
+        print(f"Call log outbox: {len(done)} delivered, {len(retry)} retrying")
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                sent = await self._drain_once()
+            except Exception as e:
+                print("❌ Outbox worker error:", e)
+                sent = 0
+
+            if sent >= OUTBOX_BATCH_SIZE:
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,188 @@
+import re
+
+# ==========================================
+# REPAIR SYNONYMS (caller wording -> repair type names)
+# ==========================================
+REPAIR_SYNONYMS = {
+    "screen": ["LCD", "OLED", "Glass", "UB Screen"],
+    "battery": ["Battery"],
+    "charge": ["Charge Port", "Charging Repair"],
+    "charging": ["Charge Port", "Charging Repair"],
+    "camera": ["Back Camera", "Front Cam", "Camera Glass"],
+    "software": ["Software", "REFLASH"],
+    "storage": ["HDD 500GB", "HDD 1TB", "SSD 500GB", "SSD 1TB"],
+    "hdmi": ["HDMI / RETIMER"],
+    "fan": ["Cooling Fan"],
+    "cpu": ["CPU"],
+    "power": ["POWER SUPPLY"],
+    "clean": ["Device Cleaning"],
+    "dock": ["Dock"],
+    "housing": ["Housing"],
+    "glass": ["Glass", "Back Glass"],
+}
+
+# Words that turn one model into another ("iphone 13" -> "iphone 13 pro").
+# A model match followed by one of these is treated as ambiguous.
+MODEL_QUALIFIERS = {
+    "pro", "max", "plus", "mini", "ultra", "lite", "se", "fe", "note",
+    "edge", "fold", "flip", "xl", "xr", "xs", "air", "slim", "oled",
+}
+
+# Endings a synonym may take ("screens", "cleaning"); anything longer is a
+# different word ("charger", "powerful", "fancy")
+SYNONYM_SUFFIXES = r"(?:s|es|ing)?"
+
+_SYNONYM_PATTERNS = {
+    keyword: re.compile(rf"\b{re.escape(keyword)}{SYNONYM_SUFFIXES}\b")
+    for keyword in REPAIR_SYNONYMS
+}
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text) -> str:
+    return _NON_WORD.sub(" ", str(text or "").lower()).strip()
+
+
+def _phrase_pattern(phrases):
+    """
+    One alternation over all phrases, longest first, on word boundaries.
+    """
+    phrases = sorted({p for p in phrases if p}, key=len, reverse=True)
+    if not phrases:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(p) for p in phrases) + r")\b")
+
+
+def format_price(price) -> str:
+    try:
+        value = float(price)
+    except (TypeError, ValueError):
+        return f"${price}"
+    return f"${value:.0f}" if value.is_integer() else f"${value:.2f}"
+
+
+class PriceIndex:
+    """
+    In-memory index over price-list rows keyed by (brand, model, repair type).
+
+    lookup() resolves a caller utterance to a single row, or returns None
+    whenever the model or repair is missing or ambiguous so the caller
+    falls back to RAG + LLM.
+    """
+
+    def __init__(self, rows=None):
+        self.rows = []
+        self.by_key = {}
+        self.by_model = {}
+        self.brands = set()
+
+        for item in rows or []:
+            brand = normalize(item.get("brand_name"))
+            model = normalize(item.get("device_model_name"))
+            repair = normalize(item.get("repair_type_name"))
+
+            if not model or not repair or item.get("price") is None:
+                continue
+
+            self.rows.append(item)
+            self.by_key.setdefault((brand, model, repair), []).append(item)
+            self.by_model.setdefault(model, []).append(item)
+            if brand:
+                self.brands.add(brand)
+
+        self._model_pattern = _phrase_pattern(self.by_model)
+        self._brand_pattern = _phrase_pattern(self.brands)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _match_model(self, text):
+        if self._model_pattern is None:
+            return None
+
+        matches = list(self._model_pattern.finditer(text))
+        if not matches:
+            return None
+
+        match = max(matches, key=lambda m: len(m.group(0)))
+        following = text[match.end():].split()[:1]
+
+        if following and (following[0] in MODEL_QUALIFIERS or following[0].isdigit()):
+            return None
+
+        return match.group(0)
+
+    def _match_rows(self, text, rows):
+        """
+        Rows for the one repair the caller mentioned, by name or synonym.
+        Mentions that name the same repairs ("screen glass") count once;
+        two separate ones ("battery ... and the screen") match nothing.
+        """
+        repairs = {normalize(row.get("repair_type_name")) for row in rows}
+
+        pattern = _phrase_pattern(repairs)
+        mentions = [{m.group(0)} for m in pattern.finditer(text)] if pattern else []
+
+        for keyword, mapped in REPAIR_SYNONYMS.items():
+            if _SYNONYM_PATTERNS[keyword].search(text):
+                names = {normalize(name) for name in mapped} & repairs
+                if names:
+                    mentions.append(names)
+
+        groups = []
+        for names in mentions:
+            overlapping = [group for group in groups if group & names]
+            for group in overlapping:
+                groups.remove(group)
+                names = names | group
+            groups.append(names)
+
+        if len(groups) != 1:
+            return []
+
+        return [row for row in rows if normalize(row.get("repair_type_name")) in groups[0]]
+
+    def lookup(self, utterance: str):
+        text = normalize(utterance)
+        model = self._match_model(text)
+
+        if model is None:
+            return None
+
+        rows = self.by_model[model]
+
+        if self._brand_pattern is not None:
+            brands = {m.group(0) for m in self._brand_pattern.finditer(text)}
+            if brands:
+                rows = [row for row in rows if normalize(row.get("brand_name")) in brands]
+
+        rows = self._match_rows(text, rows)
+
+        # Same repair listed under several categories is fine if the price agrees
+        if not rows or len({format_price(row.get("price")) for row in rows}) != 1:
+            return None
+
+        if len({normalize(row.get("repair_type_name")) for row in rows}) != 1:
+            return None
+
+        return rows[0]
+
+    def quote(self, utterance: str):
+        """
+        Templated, voice-friendly reply for an utterance, or None.
+        """
+        row = self.lookup(utterance)
+        if row is None:
+            return None
+
+        brand = row.get("brand_name") or ""
+        device = row.get("device_model_name")
+
+        if brand and not normalize(device).startswith(normalize(brand)):
+            device = f"{brand} {device}"
+
+        return (
+            f"The {row.get('repair_type_name')} repair for the {device} is "
+            f"{format_price(row.get('price'))}. Is there anything else I can help with?"
+        )
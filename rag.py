@@ -1,11 +1,23 @@
 import os
-import requests
 from dotenv import load_dotenv
-from langchain_community.vectorstores import FAISS
-from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings
-from auth import get_auth_token
+from auth import get_auth_token, get_session
+from price_index import PriceIndex
+import embeddings
+import json
 import pickle
+import hashlib
+import time
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: single worker only
+    fcntl = None
 
 load_dotenv()
 
@@ -16,33 +28,94 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 API_BASE_URL = os.getenv("API_BASE_URL")
 STORE_ID = os.getenv("STORE_ID")
 
-if not OPENAI_API_KEY:
-    raise ValueError("❌ OPENAI_API_KEY missing in .env")
-if not API_BASE_URL:
-    raise ValueError("❌ API_BASE_URL missing in .env")
-if not STORE_ID:
-    raise ValueError("❌ STORE_ID missing in .env")
-
 PRICING_API_URL = f"{API_BASE_URL}/api/v1/services/price-list/?store={STORE_ID}"
 
+# Each build goes into VECTORSTORE_PATH/gen-<n>/ (index + manifest + price rows);
+# CURRENT_PATH names the generation that is live.
 VECTORSTORE_PATH = "./cache/vectors"
+CURRENT_PATH = "./cache/vectors/CURRENT"
 EMBEDDINGS_CACHE_PATH = "./cache/embeddings.pkl"
+# Other stores get the same layout under STORES_CACHE_PATH/<store_id>/
+STORES_CACHE_PATH = "./cache/stores"
+KEEP_GENERATIONS = 2
+# Build dirs older than this were left by a crashed worker
+STALE_BUILD_SECONDS = 3600
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", "4"))
+
+# flat = exact search; hnsw / ivfpq = approximate, for catalogs of 100k+ rows
+RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "flat").lower()
+RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+RAG_HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "80"))
+RAG_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+# 0 = about 4 * sqrt(rows)
+RAG_IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "0"))
+RAG_IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+# 0 = the largest of 64/48/32/16/8 that splits the embedding into 8+ dim chunks
+RAG_PQ_M = int(os.getenv("RAG_PQ_M", "0"))
+RAG_PQ_BITS = int(os.getenv("RAG_PQ_BITS", "8"))
+# Index files at least this big are memory-mapped instead of read into RAM
+RAG_MMAP_MIN_MB = float(os.getenv("RAG_MMAP_MIN_MB", "64"))
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+# faiss needs this many training points per centroid
+TRAINING_POINTS_PER_CENTROID = 39
+
+# langchain / FAISS are imported inside the functions that need them so
+# importing this module stays cheap and side-effect free.
+
+
+@dataclass(frozen=True)
+class RagPaths:
+    vectors: str
+    current: str
+    embeddings: str
+
+
+DEFAULT_PATHS = RagPaths(VECTORSTORE_PATH, CURRENT_PATH, EMBEDDINGS_CACHE_PATH)
+
+
+def store_paths(store_id=None) -> RagPaths:
+    """
+    Where a store's generations and embeddings cache live. The STORE_ID
+    store keeps the original single-store layout, so existing caches stay valid.
+    """
+    if store_id is None or str(store_id) == str(STORE_ID):
+        return DEFAULT_PATHS
+
+    base = os.path.join(STORES_CACHE_PATH, str(store_id))
+    vectors = os.path.join(base, "vectors")
+    return RagPaths(vectors, os.path.join(vectors, "CURRENT"), os.path.join(base, "embeddings.pkl"))
 
-os.makedirs("./cache", exist_ok=True)
+
+def check_config(store_id=None):
+    if not OPENAI_API_KEY:
+        raise ValueError("❌ OPENAI_API_KEY missing in .env")
+    if not API_BASE_URL:
+        raise ValueError("❌ API_BASE_URL missing in .env")
+    if not (store_id or STORE_ID):
+        raise ValueError("❌ STORE_ID missing in .env")
+
+    os.makedirs(store_paths(store_id).vectors, exist_ok=True)
 
 # ==========================================
 # 1⃣ FETCH PRICING DATA
 # ==========================================
-def fetch_pricing_documents():
+def pricing_api_url(store_id=None) -> str:
+    return f"{API_BASE_URL}/api/v1/services/price-list/?store={store_id or STORE_ID}"
+
+
+def fetch_pricing_rows(store_id=None):
     """
-    Fetch pricing data from API and return as LangChain Document list
+    Fetch the raw price-list rows from the API
     """
     auth_token = get_auth_token()
     if not auth_token:
         raise ValueError("❌ PRICING_API_AUTH_TOKEN not found")
 
     headers = {"Authorization": f"Bearer {auth_token}", "Content-Type": "application/json"}
-    response = requests.get(PRICING_API_URL, headers=headers, timeout=20)
+    response = get_session().get(pricing_api_url(store_id), headers=headers, timeout=20)
     response.raise_for_status()
     data = response.json()
 
@@ -52,112 +125,713 @@ def fetch_pricing_documents():
     if not isinstance(data, list):
         raise ValueError("API did not return a list.")
 
-    documents = [
-        Document(
-            page_content=f"""
+    return data
+
+
+def row_id(item) -> str:
+    """
+    Stable identity of a price-list row across fetches
+    """
+    if item.get("id") is not None:
+        return str(item.get("id"))
+
+    return "|".join(
+        str(item.get(field) or "")
+        for field in ["brand_name", "device_model_name", "repair_type_name", "category_name"]
+    )
+
+
+def rows_to_documents(rows):
+    from langchain_core.documents import Document
+
+    documents = []
+    seen = {}
+
+    for item in rows:
+        doc_id = row_id(item)
+        seen[doc_id] = seen.get(doc_id, 0) + 1
+        if seen[doc_id] > 1:
+            doc_id = f"{doc_id}#{seen[doc_id]}"
+
+        documents.append(
+            Document(
+                page_content=f"""
 Repair pricing:
 Store: {item.get("store_name")}
 Device: {item.get("brand_name")} {item.get("device_model_name")}
 Repair: {item.get("repair_type_name")}
 Category: {item.get("category_name")}
 Price: ${item.get("price")}
-""".strip()
+""".strip(),
+                metadata={"row_id": doc_id},
+            )
         )
-        for item in data
-    ]
 
     return documents
 
+
+def fetch_pricing_documents():
+    """
+    Fetch pricing data from API and return as LangChain Document list
+    """
+    return rows_to_documents(fetch_pricing_rows())
+
+
 # ==========================================
 # 2⃣ CACHE / LOAD EMBEDDINGS
 # ==========================================
-def get_cached_embeddings(documents):
+def get_embeddings_model():
+    """
+    EMBEDDINGS_BACKEND picks it; see embeddings.py. Index and query vectors
+    always come from the same one.
+    """
+    return embeddings.get_embeddings_model(batch_size=EMBED_BATCH_SIZE)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def embed_texts(texts, embeddings_model):
+    """
+    Embed texts in EMBED_BATCH_SIZE batches, at most EMBED_MAX_WORKERS in flight.
+    """
+    if not texts:
+        return []
+
+    batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(EMBED_MAX_WORKERS, len(batches)))) as pool:
+        results = list(pool.map(embeddings_model.embed_documents, batches))
+
+    return [vector for batch in results for vector in batch]
+
+
+def load_embeddings_cache(cache_path=EMBEDDINGS_CACHE_PATH, signature=None) -> dict:
+    """
+    content hash -> vector, only if the cache was written by the backend
+    with this signature.
+    """
+    signature = signature or embeddings.signature()
+
+    if not os.path.exists(cache_path):
+        return {}
+
+    try:
+        with open(cache_path, "rb") as f:
+            cache = pickle.load(f)
+    except Exception as e:
+        print("⚠ Failed to load embeddings cache:", e)
+        return {}
+
+    # Older caches were a bare list with no link back to the documents,
+    # then a bare dict of OpenAI vectors
+    if not isinstance(cache, dict):
+        return {}
+
+    if "vectors" not in cache:
+        return cache if signature == embeddings.LEGACY_SIGNATURE else {}
+
+    if cache.get("signature") != signature:
+        print(f"🔁 Embeddings cache is for {cache.get('signature')}, re-embedding with {signature}")
+        return {}
+
+    return cache["vectors"]
+
+
+def get_cached_embeddings(documents, embeddings_model=None, cache_path=EMBEDDINGS_CACHE_PATH):
     """
-    Generate embeddings for documents, cache them locally.
+    Return one vector per document, embedding only texts missing from the
+    content-hash keyed cache. The cache is pruned to the current documents.
     """
-    if os.path.exists(EMBEDDINGS_CACHE_PATH):
-        with open(EMBEDDINGS_CACHE_PATH, "rb") as f:
-            print("✅ Loaded cached embeddings")
-            return pickle.load(f)
+    signature = embeddings.signature()
+    cache = load_embeddings_cache(cache_path, signature)
+    hashes = [content_hash(doc.page_content) for doc in documents]
+
+    missing = {}
+    for key, doc in zip(hashes, documents):
+        if key not in cache:
+            missing[key] = doc.page_content
 
-    embeddings_model = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-    embeddings_list = [embeddings_model.embed_query(doc.page_content) for doc in documents]
+    if missing:
+        embeddings_model = embeddings_model or get_embeddings_model()
+        vectors = embed_texts(list(missing.values()), embeddings_model)
+        cache.update(zip(missing.keys(), vectors))
+        print(f"✅ Embedded {len(missing)} new documents")
+    else:
+        print("✅ Loaded cached embeddings")
 
-    with open(EMBEDDINGS_CACHE_PATH, "wb") as f:
-        pickle.dump(embeddings_list, f)
-        print("✅ Saved embeddings cache")
+    cache = {key: cache[key] for key in hashes}
 
-    return embeddings_list
+    with open(cache_path, "wb") as f:
+        pickle.dump({"signature": signature, "vectors": cache}, f)
+
+    return [cache[key] for key in hashes]
 
 # ==========================================
 # 3⃣ BUILD VECTORSTORE
 # ==========================================
-def build_vectorstore():
-    documents = fetch_pricing_documents()
-    if not documents:
-        print("⚠ No documents found. Skipping vectorstore build.")
+def _ivfpq_index(vectors):
+    """
+    Trained IVF-PQ index, or None when there are too few vectors to train
+    even 4-bit codebooks (the caller falls back to flat).
+    """
+    import faiss
+
+    count, dim = vectors.shape
+    bits = next(
+        (b for b in range(RAG_PQ_BITS, 3, -1) if count >= TRAINING_POINTS_PER_CENTROID * 2 ** b),
+        None,
+    )
+    if bits is None:
         return None
 
-    embeddings_list = get_cached_embeddings(documents)
-    vectorstore = FAISS.from_documents(documents, OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY))
-    vectorstore.save_local(VECTORSTORE_PATH)
-    print("✅ Vectorstore built and cached successfully")
+    nlist = RAG_IVF_NLIST or int(4 * count ** 0.5)
+    nlist = max(1, min(nlist, count // TRAINING_POINTS_PER_CENTROID))
+
+    # Sub-vectors under 8 dims train several times slower for little gain
+    m = RAG_PQ_M or next((m for m in (64, 48, 32, 16, 8) if dim % m == 0 and dim // m >= 8), 1)
+    if dim % m:
+        raise ValueError(f"RAG_PQ_M={m} does not divide the embedding size {dim}")
+
+    index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, m, bits)
+    index.train(vectors)
+    print(f"✅ Trained IVF-PQ index ({nlist} lists, {m}x{bits}-bit codes) on {count} vectors")
+    return index
+
+
+def build_faiss_index(vectors, kind=RAG_INDEX_TYPE):
+    """
+    Empty FAISS index of the given type, already trained on `vectors`
+    (a float32 matrix) where the type needs training.
+    """
+    import faiss
+
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown RAG_INDEX_TYPE: {kind} (expected one of {', '.join(INDEX_TYPES)})")
+
+    dim = vectors.shape[1]
+    index = None
+
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, RAG_HNSW_M)
+        index.hnsw.efConstruction = RAG_HNSW_EF_CONSTRUCTION
+
+    elif kind == "ivfpq":
+        index = _ivfpq_index(vectors)
+        if index is None:
+            print(f"⚠ Only {len(vectors)} vectors, too few to train IVF-PQ; using a flat index")
+
+    if index is None:
+        index = faiss.IndexFlatL2(dim)
+
+    configure_search(index)
+    return index
+
+
+def configure_search(index):
+    """
+    Apply the search-time knobs; they are not tied to the build, so they
+    also retune indexes loaded from disk.
+    """
+    import faiss
+
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = RAG_HNSW_EF_SEARCH
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(RAG_IVF_NPROBE, ivf.nlist)
+
+
+def index_type(index) -> str:
+    import faiss
+
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivfpq"
+    return "flat"
+
+
+def vectorstore_from_vectors(documents, vectors, embeddings_model, kind=RAG_INDEX_TYPE):
+    """
+    LangChain FAISS store around a RAG_INDEX_TYPE index holding precomputed vectors.
+    """
+    import numpy as np
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    index = build_faiss_index(np.asarray(vectors, dtype="float32"), kind)
+
+    vectorstore = FAISS(
+        embedding_function=embeddings_model,
+        index=index,
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+    )
+    vectorstore.add_embeddings(
+        text_embeddings=list(zip([doc.page_content for doc in documents], vectors)),
+        metadatas=[doc.metadata for doc in documents],
+        ids=[doc.metadata["row_id"] for doc in documents],
+    )
+    return vectorstore
+
+
+def vectorstore_from_documents(documents, paths=DEFAULT_PATHS):
+    """
+    Build FAISS from precomputed vectors so each document is embedded once.
+    """
+    embeddings_model = get_embeddings_model()
+    embeddings_list = get_cached_embeddings(documents, embeddings_model, paths.embeddings)
+
+    return vectorstore_from_vectors(documents, embeddings_list, embeddings_model)
+
+
+# Manifest entry (not a row): catalog size an IVF-PQ index was trained on
+TRAINED_ROWS_KEY = "__trained_rows__"
+
+
+def document_manifest(documents, vectorstore=None) -> dict:
+    """
+    row_id -> content hash. Pass the freshly built vectorstore to also
+    record how many rows an IVF-PQ index was trained on.
+    """
+    manifest = {doc.metadata["row_id"]: content_hash(doc.page_content) for doc in documents}
+
+    if vectorstore is not None and index_type(vectorstore.index) == "ivfpq":
+        manifest[TRAINED_ROWS_KEY] = len(documents)
+
+    return manifest
+
+
+def update_vectorstore_incremental(vectorstore, documents, manifest, cache_path=EMBEDDINGS_CACHE_PATH):
+    """
+    Apply only the row-level differences between `manifest` and `documents`
+    to an already loaded FAISS index. Returns the new manifest.
+    """
+    manifest = dict(manifest)
+    trained_rows = manifest.pop(TRAINED_ROWS_KEY, None)
+    new_manifest = document_manifest(documents)
+
+    stale = [doc_id for doc_id, digest in manifest.items() if new_manifest.get(doc_id) != digest]
+    fresh = [doc for doc in documents if manifest.get(doc.metadata["row_id"]) != new_manifest[doc.metadata["row_id"]]]
+
+    indexed = set(vectorstore.index_to_docstore_id.values())
+    stale = [doc_id for doc_id in stale if doc_id in indexed]
 
-    retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 3})
-    return retriever
+    kind = index_type(vectorstore.index)
+
+    if kind != RAG_INDEX_TYPE:
+        raise ValueError(f"live index is {kind}, RAG_INDEX_TYPE is {RAG_INDEX_TYPE}")
+    # HNSW can't remove vectors, and IVF keeps the removed ids' numbering,
+    # which LangChain's position-based delete() doesn't expect
+    if kind != "flat" and stale:
+        raise ValueError(f"{kind} indexes can't drop rows in place")
+    # IVF lists trained on a much smaller catalog get long and slow
+    if kind == "ivfpq" and len(documents) > 2 * (trained_rows or vectorstore.index.ntotal):
+        raise ValueError("catalog more than doubled since the IVF-PQ index was trained")
+
+    if stale:
+        vectorstore.delete(stale)
+
+    if fresh:
+        # Through the content-hash cache, so a later full rebuild reuses these vectors
+        vectors = get_cached_embeddings(documents, vectorstore.embeddings, cache_path)
+        fresh_ids = {doc.metadata["row_id"] for doc in fresh}
+        embeddings_list = [vector for doc, vector in zip(documents, vectors) if doc.metadata["row_id"] in fresh_ids]
+
+        vectorstore.add_embeddings(
+            text_embeddings=list(zip([doc.page_content for doc in fresh], embeddings_list)),
+            metadatas=[doc.metadata for doc in fresh],
+            ids=[doc.metadata["row_id"] for doc in fresh],
+        )
+
+    if trained_rows:
+        new_manifest[TRAINED_ROWS_KEY] = trained_rows
+
+    print(f"✅ Incremental update: {len(fresh)} added, {len(stale)} removed, "
+          f"{len(documents) - len(fresh)} unchanged")
+
+    return new_manifest
 
 # ==========================================
-# 4⃣ LOAD OR BUILD VECTORSTORE
+# 4⃣ GENERATIONS ON DISK
 # ==========================================
-def load_or_build_vectorstore():
-    if os.path.exists(VECTORSTORE_PATH):
-        try:
-            vectorstore = FAISS.load_local(VECTORSTORE_PATH, OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY))
-            print("✅ Vectorstore loaded from cache")
-            return vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 3})
-        except Exception as e:
-            print("⚠ Failed to load vectorstore:", e)
-
-    # fallback: build new
-    return build_vectorstore()
-
-# Build retriever globally
-retriever = load_or_build_vectorstore()
+def current_generation_path(paths=DEFAULT_PATHS):
+    if not os.path.exists(paths.current):
+        return None
+
+    with open(paths.current, "r") as f:
+        name = f.read().strip()
+
+    path = os.path.join(paths.vectors, name)
+    return path if name and os.path.isdir(path) else None
+
+
+def new_generation_path(paths=DEFAULT_PATHS):
+    numbers = [
+        int(name[len("gen-"):])
+        for name in os.listdir(paths.vectors)
+        if name.startswith("gen-") and name[len("gen-"):].isdigit()
+    ]
+    return os.path.join(paths.vectors, f"gen-{max(numbers, default=0) + 1:06d}")
+
+
+@contextmanager
+def generation_lock(paths=DEFAULT_PATHS, name=".lock"):
+    """
+    Serializes claiming a generation number and flipping CURRENT across
+    worker processes. StoreIndex.rebuild() holds name=".rebuild.lock" for
+    a whole rebuild so two workers never rebuild one store at once.
+    """
+    lock_fd = os.open(os.path.join(paths.vectors, name), os.O_CREAT | os.O_RDWR, 0o644)
+
+    try:
+        if fcntl:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        if fcntl:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
+
+
+def _touch(path: str):
+    with open(path, "a"):
+        pass
+    os.utime(path, None)
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def mark_stale(store_id=None):
+    """
+    Flag a store's saved generation as out of date (e.g. on a global
+    /update-rag). Whichever worker next loads or syncs the store rebuilds
+    it first; stores that are never loaded cost nothing.
+    """
+    paths = store_paths(store_id)
+    os.makedirs(paths.vectors, exist_ok=True)
+    _touch(os.path.join(paths.vectors, "STALE"))
+
+
+def mark_refreshed(paths=DEFAULT_PATHS):
+    """
+    Called as a rebuild starts fetching pricing: stale marks made before
+    this are covered by it, later ones ask for another pass.
+    """
+    _touch(os.path.join(paths.vectors, "REFRESHED"))
+
+
+def is_stale(paths=DEFAULT_PATHS) -> bool:
+    stamp = _mtime(os.path.join(paths.vectors, "STALE"))
+    return stamp > _mtime(os.path.join(paths.vectors, "REFRESHED"))
+
+
+def save_generation(vectorstore, manifest, rows, paths=DEFAULT_PATHS):
+    """
+    Write a complete generation into a private build dir, then (under the
+    generation lock) rename it to the next gen-<n> and flip CURRENT to it.
+    Returns the generation path.
+    """
+    build_path = tempfile.mkdtemp(prefix=".build-", dir=paths.vectors)
+    vectorstore.save_local(build_path)
+
+    with open(os.path.join(build_path, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+
+    with open(os.path.join(build_path, "embeddings.json"), "w") as f:
+        json.dump({"signature": embeddings.signature()}, f)
+
+    with open(os.path.join(build_path, "price_rows.json"), "w") as f:
+        json.dump(rows, f)
+
+    with generation_lock(paths):
+        path = new_generation_path(paths)
+        os.rename(build_path, path)
+
+        tmp_path = paths.current + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(os.path.basename(path))
+        os.replace(tmp_path, paths.current)
+
+        # Drop old generations; live snapshots are already in memory
+        names = sorted(name for name in os.listdir(paths.vectors) if name.startswith("gen-"))
+        for name in names[:-KEEP_GENERATIONS]:
+            shutil.rmtree(os.path.join(paths.vectors, name), ignore_errors=True)
+
+        cutoff = time.time() - STALE_BUILD_SECONDS
+        for name in os.listdir(paths.vectors):
+            stale_path = os.path.join(paths.vectors, name)
+            if name.startswith(".build-") and os.path.getmtime(stale_path) < cutoff:
+                shutil.rmtree(stale_path, ignore_errors=True)
+
+    return path
+
+
+def load_vectorstore(path, embeddings_model, mmap=True):
+    """
+    Read what FAISS.save_local() wrote. Index files of RAG_MMAP_MIN_MB or
+    more are memory-mapped read-only: startup doesn't copy the vectors,
+    pages are faulted in as searches touch them, and uvicorn workers share
+    them through the page cache. Pass mmap=False to get a writable index.
+    """
+    import faiss
+    from langchain_community.vectorstores import FAISS
+
+    index_path = os.path.join(path, "index.faiss")
+    flags = 0
+
+    if mmap and os.path.getsize(index_path) >= RAG_MMAP_MIN_MB * 1024 * 1024:
+        # IFC maps flat/HNSW vectors in place; older faiss only maps IVF lists
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+    index = faiss.read_index(index_path, flags)
+    configure_search(index)
+
+    # our own file, written by save_generation()
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    return FAISS(
+        embedding_function=embeddings_model,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+
+
+def generation_signature(path) -> str:
+    try:
+        with open(os.path.join(path, "embeddings.json"), "r") as f:
+            return json.load(f)["signature"]
+    except FileNotFoundError:
+        return embeddings.LEGACY_SIGNATURE
+
+
+def load_generation(path, mmap=True):
+    """
+    Returns (vectorstore, manifest, rows) for a generation directory.
+    Raises ValueError if it was embedded by another backend: queries would
+    land in a different vector space, so callers rebuild instead.
+    """
+    built_with, configured = generation_signature(path), embeddings.signature()
+    if built_with != configured:
+        raise ValueError(f"🔁 {os.path.basename(path)} was embedded with {built_with}, EMBEDDINGS_BACKEND is {configured}")
+
+    vectorstore = load_vectorstore(path, get_embeddings_model(), mmap=mmap)
+
+    with open(os.path.join(path, "manifest.json"), "r") as f:
+        manifest = json.load(f)
+
+    with open(os.path.join(path, "price_rows.json"), "r") as f:
+        rows = json.load(f)
+
+    return vectorstore, manifest, rows
+
 # ==========================================
-# 5⃣ REBUILD VECTORSTORE (Optional)
+# 5⃣ LIVE SNAPSHOT (atomic hot-swap)
 # ==========================================
-def rebuild_vectorstore():
+# Loaded indexes cost about this many times their pickled docstore + rows on disk
+MEMORY_PER_DISK_BYTE = 3
+
+
+@dataclass(frozen=True)
+class RagSnapshot:
+    generation: int
+    retriever: object
+    price_index: PriceIndex
+    path: str
+
+    def memory_estimate(self) -> int:
+        """
+        Rough resident size in bytes, from the generation's files: the
+        FAISS index as-is, Python objects a few times their pickled size.
+        """
+        if not self.path:
+            return 0
+
+        total = 0
+        for name, factor in (("index.faiss", 1), ("index.pkl", MEMORY_PER_DISK_BYTE), ("price_rows.json", MEMORY_PER_DISK_BYTE)):
+            try:
+                total += os.path.getsize(os.path.join(self.path, name)) * factor
+            except OSError:
+                pass
+        return total
+
+
+class StoreIndex:
     """
-    Force rebuild of vectorstore using fresh pricing data and embeddings.
+    One store's live snapshot and the build / load / rebuild steps that
+    replace it. Each store has its own generations and embeddings cache
+    (see store_paths()). Blocking methods: call them from a worker thread.
     """
-    global retriever
-    print("🔄 Rebuilding vectorstore & updating cache...")
 
-    documents = fetch_pricing_documents()
-    if not documents:
-        print("⚠ No documents found. Skipping rebuild.")
-        return retriever
+    def __init__(self, store_id=None):
+        self.store_id = store_id or STORE_ID
+        self.paths = store_paths(self.store_id)
+        self._snapshot = RagSnapshot(generation=0, retriever=None, price_index=PriceIndex(), path=None)
+        self._publish_lock = threading.Lock()
+
+    def get_snapshot(self) -> RagSnapshot:
+        """
+        The retriever and price index a turn should use, start to finish.
+        """
+        return self._snapshot
+
+    def publish(self, vectorstore, rows, path) -> RagSnapshot:
+        with self._publish_lock:
+            self._snapshot = RagSnapshot(
+                generation=self._snapshot.generation + 1,
+                retriever=vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 3}),
+                price_index=PriceIndex(rows),
+                path=path,
+            )
+
+        print(f"✅ RAG generation {self._snapshot.generation} live for store {self.store_id} "
+              f"({len(self._snapshot.price_index)} price rows)")
+        return self._snapshot
+
+    def sync_current_generation(self) -> bool:
+        """
+        Pick up a generation published by another worker process (CURRENT moved
+        past the one this process serves). Returns True if a new one went live.
+        """
+        path = current_generation_path(self.paths)
+        snapshot = self.get_snapshot()
+
+        if not path or snapshot.retriever is None or path == snapshot.path:
+            return False
+
+        vectorstore, _, rows = load_generation(path)
+        self.publish(vectorstore, rows, path)
+        return True
+
+    def is_stale(self) -> bool:
+        return is_stale(self.paths)
+
+    def build(self):
+        mark_refreshed(self.paths)
+        rows = fetch_pricing_rows(self.store_id)
+        documents = rows_to_documents(rows)
+        if not documents:
+            print(f"⚠ No documents found for store {self.store_id}. Skipping vectorstore build.")
+            return None
+
+        vectorstore = vectorstore_from_documents(documents, self.paths)
+        path = save_generation(vectorstore, document_manifest(documents, vectorstore), rows, self.paths)
+        print("✅ Vectorstore built and cached successfully")
+
+        return self.publish(vectorstore, rows, path).retriever
+
+    def load_or_build(self):
+        check_config(self.store_id)
+
+        if self.is_stale():
+            try:
+                self.rebuild(if_stale=True)
+            except Exception as e:
+                print("⚠ Failed to refresh stale vectorstore, loading the saved one:", e)
+
+            if self.get_snapshot().retriever is not None:
+                return self.get_snapshot().retriever
 
-    # Remove old FAISS index folder
-    if os.path.exists(VECTORSTORE_PATH):
-        import shutil
-        shutil.rmtree(VECTORSTORE_PATH)
-        print("✅ Old vectorstore cleared")
+        path = current_generation_path(self.paths)
 
-    # Remove old embeddings cache
-    if os.path.exists(EMBEDDINGS_CACHE_PATH):
-        os.remove(EMBEDDINGS_CACHE_PATH)
-        print("✅ Old embeddings cache cleared")
+        if path:
+            try:
+                vectorstore, _, rows = load_generation(path)
+                print("✅ Vectorstore loaded from cache")
+                return self.publish(vectorstore, rows, path).retriever
+            except Exception as e:
+                print("⚠ Failed to load vectorstore:", e)
 
-    # Create fresh embeddings
-    embeddings_model = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-    embeddings_list = [embeddings_model.embed_query(doc.page_content) for doc in documents]
+        # fallback: build new
+        return self.build()
 
-    # Build FAISS from fresh documents & embeddings
-    vectorstore = FAISS.from_documents(documents, embeddings_model)
-    vectorstore.save_local(VECTORSTORE_PATH)
+    def rebuild(self, if_stale=False):
+        """
+        Refresh the vectorstore from fresh pricing data into a new generation
+        directory and publish it. Only new or changed rows are embedded; deleted
+        rows are removed. Falls back to a full build when the live generation
+        can't be loaded. With if_stale, a store another worker refreshed since
+        it was marked stale just picks up that generation instead.
+        """
+        check_config(self.store_id)
 
-    retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 3})
-    print("✅ Vectorstore rebuilt and saved successfully")
+        with generation_lock(self.paths, ".rebuild.lock"):
+            if if_stale and not self.is_stale():
+                self.sync_current_generation()
+                return self.get_snapshot().retriever
 
-    return retriever
+            return self._rebuild()
+
+    def _rebuild(self):
+        print(f"🔄 Rebuilding vectorstore & updating cache for store {self.store_id}...")
+        mark_refreshed(self.paths)
+
+        rows = fetch_pricing_rows(self.store_id)
+        documents = rows_to_documents(rows)
+        if not documents:
+            print("⚠ No documents found. Skipping rebuild.")
+            return self.get_snapshot().retriever
+
+        vectorstore = None
+        live_path = current_generation_path(self.paths)
+
+        if live_path:
+            try:
+                # Writable copy: a memory-mapped index is read-only
+                vectorstore, manifest, _ = load_generation(live_path, mmap=False)
+                manifest = update_vectorstore_incremental(vectorstore, documents, manifest, self.paths.embeddings)
+            except Exception as e:
+                print("⚠ Incremental update failed, doing full rebuild:", e)
+                vectorstore = None
+
+        if vectorstore is None:
+            vectorstore = vectorstore_from_documents(documents, self.paths)
+            manifest = document_manifest(documents, vectorstore)
+
+        path = save_generation(vectorstore, manifest, rows, self.paths)
+        print("✅ Vectorstore rebuilt and saved successfully")
+
+        return self.publish(vectorstore, rows, path).retriever
+
+
+# ==========================================
+# 6⃣ SINGLE-STORE API (the STORE_ID store)
+# ==========================================
+default_index = StoreIndex()
+
+
+def get_snapshot() -> RagSnapshot:
+    return default_index.get_snapshot()
+
+
+def publish(vectorstore, rows, path) -> RagSnapshot:
+    return default_index.publish(vectorstore, rows, path)
+
+
+def sync_current_generation() -> bool:
+    return default_index.sync_current_generation()
+
+
+def build_vectorstore():
+    return default_index.build()
+
+
+def load_or_build_vectorstore():
+    return default_index.load_or_build()
+
+
+def rebuild_vectorstore():
+    """
+    Blocking: call it from a worker thread.
+    """
+    return default_index.rebuild()
@@ -0,0 +1,335 @@
+import os
+import time
+import glob
+import asyncio
+import tempfile
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+import mp3_concat
+
+load_dotenv()
+
+# ==========================================
+# ENV VARIABLES
+# ==========================================
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RECORDINGS_DIR = os.path.join(BASE_DIR, "recordings")  # folder where MP3s are
+
+RECORDING_DOWNLOAD_CONCURRENCY = int(os.getenv("RECORDING_DOWNLOAD_CONCURRENCY", "4"))
+RECORDING_DOWNLOAD_TIMEOUT = float(os.getenv("RECORDING_DOWNLOAD_TIMEOUT", "120"))
+RECORDING_CHUNK_SIZE = int(os.getenv("RECORDING_CHUNK_SIZE", str(64 * 1024)))
+
+RECORDING_MERGE_TIMEOUT = float(os.getenv("RECORDING_MERGE_TIMEOUT", "120"))
+RECORDING_MERGE_WORKERS = int(os.getenv("RECORDING_MERGE_WORKERS", str(os.cpu_count() or 1)))
+
+# Temp files older than this are leftovers from a crashed download
+STALE_PART_SECONDS = 3600
+# Segments downloaded by another worker only show up on disk; look this often
+SEGMENT_POLL_SECONDS = 2
+# /recording-complete normally follows within seconds; calls that never get it
+# (dropped callback, merge served by another worker) don't keep their events
+LANDED_TTL_SECONDS = 3600
+
+_client = None
+_semaphore = None
+_merge_pool = None
+
+# final path -> download task, so duplicate callbacks share one download
+_inflight = {}
+# final path -> Event set once its download finished (or failed)
+_landed = {}
+# final path -> when its event was set, oldest first, for expiry
+_landed_at = OrderedDict()
+# CallSid -> merge task, so a repeated /recording-complete doesn't merge twice
+_merges = {}
+
+STATS = {"downloaded": 0, "skipped": 0, "failed": 0, "bytes": 0, "merged": 0, "merged_frames": 0, "merged_decode": 0, "merge_timeouts": 0}
+
+
+def segment_path(call_sid: str, index) -> str:
+    return os.path.join(RECORDINGS_DIR, f"{call_sid}_{index}.mp3")
+
+
+# ==========================================
+# SHARED CLIENT
+# ==========================================
+def get_client():
+    """
+    One pooled httpx client for Twilio media. Recording URLs redirect to
+    signed storage URLs; httpx drops the credentials on that hop.
+    """
+    global _client
+
+    import httpx
+
+    if _client is None:
+        _client = httpx.AsyncClient(
+            auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
+            timeout=RECORDING_DOWNLOAD_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=RECORDING_DOWNLOAD_CONCURRENCY,
+                max_keepalive_connections=RECORDING_DOWNLOAD_CONCURRENCY,
+            ),
+        )
+
+    return _client
+
+
+def _get_semaphore():
+    global _semaphore
+
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(RECORDING_DOWNLOAD_CONCURRENCY)
+
+    return _semaphore
+
+
+def _get_merge_pool():
+    global _merge_pool
+
+    if _merge_pool is None:
+        # spawn, not fork: the server process has threads and an event loop
+        _merge_pool = ProcessPoolExecutor(
+            max_workers=RECORDING_MERGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    return _merge_pool
+
+
+async def close():
+    global _client, _merge_pool
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+    if _merge_pool is not None:
+        _merge_pool.shutdown(wait=False, cancel_futures=True)
+        _merge_pool = None
+
+
+def cleanup_partials():
+    """
+    Remove temp files left behind by downloads that died mid-stream.
+    """
+    os.makedirs(RECORDINGS_DIR, exist_ok=True)
+    cutoff = time.time() - STALE_PART_SECONDS
+
+    for path in glob.glob(os.path.join(RECORDINGS_DIR, ".*.part")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def stats() -> dict:
+    return {**STATS, "in_flight": len(_inflight), "merging": len(_merges), "tracked": len(_landed)}
+
+
+# ==========================================
+# DOWNLOADS
+# ==========================================
+async def _stream_to_file(download_url: str, path: str):
+    async with _get_semaphore():
+        # Another worker (or an earlier callback) may have finished it meanwhile
+        if os.path.exists(path):
+            STATS["skipped"] += 1
+            return path
+
+        fd, tmp_path = tempfile.mkstemp(
+            dir=RECORDINGS_DIR, prefix=f".{os.path.basename(path)}.", suffix=".part"
+        )
+        size = 0
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async with get_client().stream("GET", download_url) as response:
+                    response.raise_for_status()
+
+                    # Chunks are small, so the writes don't hold up the loop
+                    async for chunk in response.aiter_bytes(RECORDING_CHUNK_SIZE):
+                        f.write(chunk)
+                        size += len(chunk)
+
+            os.replace(tmp_path, path)
+
+        except BaseException as e:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            if not isinstance(e, asyncio.CancelledError):
+                STATS["failed"] += 1
+            raise
+
+        STATS["downloaded"] += 1
+        STATS["bytes"] += size
+        return path
+
+
+async def download_recording(call_sid: str, recording_url: str, segment_index: int):
+    """
+    Stream one recording segment to recordings/<CallSid>_<n>.mp3.
+
+    Idempotent: an existing file is kept, and a duplicate callback for a
+    segment that is still downloading waits on the same download. The file
+    only appears once complete (temp file + atomic rename), so readers never
+    see a partial MP3. Returns the path, or None on failure.
+    """
+    if not recording_url:
+        return None
+
+    path = segment_path(call_sid, segment_index)
+
+    if os.path.exists(path):
+        STATS["skipped"] += 1
+        return path
+
+    task = _inflight.get(path)
+
+    if task is None:
+        task = asyncio.create_task(_stream_to_file(f"{recording_url}.mp3", path))
+        _inflight[path] = task
+        task.add_done_callback(lambda _: _inflight.pop(path, None))
+        task.add_done_callback(lambda _: _mark_landed(path))
+
+    try:
+        await asyncio.shield(task)
+        print(f"✅ Recording saved: {path}")
+        return path
+
+    except Exception as e:
+        print(f"❌ Failed to download recording {call_sid}: {e}")
+        return None
+
+
+# ==========================================
+# COMPLETION TRACKING + MERGE
+# ==========================================
+def _landed_event(path: str) -> asyncio.Event:
+    event = _landed.get(path)
+    if event is None:
+        event = _landed[path] = asyncio.Event()
+    return event
+
+
+def _mark_landed(path: str):
+    _landed_event(path).set()
+    _landed_at[path] = time.monotonic()
+    _landed_at.move_to_end(path)
+
+    # Drop events no merge came for
+    cutoff = time.monotonic() - LANDED_TTL_SECONDS
+    while _landed_at:
+        oldest, landed_at = next(iter(_landed_at.items()))
+        if landed_at >= cutoff:
+            break
+        del _landed_at[oldest]
+        _landed.pop(oldest, None)
+
+
+async def wait_for_segment(path: str) -> bool:
+    """
+    Wait until a segment's download has finished. Woken by the download in
+    this process; segments fetched by another worker are noticed on disk.
+    """
+    event = _landed_event(path)
+
+    while not os.path.exists(path) and not event.is_set():
+        try:
+            await asyncio.wait_for(event.wait(), timeout=SEGMENT_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+    return os.path.exists(path)
+
+
+def _decode_merge(paths, output_path: str):
+    from pydub import AudioSegment
+
+    combined = AudioSegment.empty()
+    for path in paths:
+        combined += AudioSegment.from_mp3(path)
+
+    combined.export(output_path, format="mp3")
+
+
+def merge_segments(paths, output_path: str) -> str:
+    """
+    Concatenate MP3 segments into output_path. Frames are copied as-is;
+    only segments with different stream formats are decoded and
+    re-encoded. Blocking and CPU-bound: runs in the merge process pool.
+    Returns the method used.
+    """
+    tmp_path = output_path + ".part"
+
+    try:
+        mp3_concat.concat(paths, tmp_path)
+        method = "frames"
+    except ValueError as e:
+        print(f"⚠ Frame merge not possible ({e}), decoding instead")
+        _decode_merge(paths, tmp_path)
+        method = "decode"
+
+    os.replace(tmp_path, output_path)
+    return method
+
+
+async def _merge_call(call_sid: str, segment_count: int):
+    paths = [segment_path(call_sid, index) for index in range(1, segment_count + 1)]
+
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*[wait_for_segment(path) for path in paths]),
+            timeout=RECORDING_MERGE_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        STATS["merge_timeouts"] += 1
+        print(f"⚠ Timed out waiting for recording segments of {call_sid}")
+
+    present = [path for path in paths if os.path.exists(path)]
+    for path in paths:
+        _landed.pop(path, None)
+        _landed_at.pop(path, None)
+        if path not in present:
+            print(f"❌ Segment {os.path.basename(path)} not found, skipping")
+
+    if not present:
+        return None
+
+    full_file = segment_path(call_sid, "full")
+    method = await asyncio.get_running_loop().run_in_executor(
+        _get_merge_pool(), merge_segments, present, full_file
+    )
+
+    STATS["merged"] += 1
+    STATS[f"merged_{method}"] += 1
+    print(f"✅ Full call recording saved as {full_file} ({method})")
+    return full_file
+
+
+async def merge_call_recording(call_sid: str, segment_count: int):
+    """
+    Merge a call's segments once every one of them has landed (or the
+    merge timeout runs out). Returns the merged file path, or None.
+    """
+    task = _merges.get(call_sid)
+
+    if task is None:
+        task = asyncio.create_task(_merge_call(call_sid, segment_count))
+        _merges[call_sid] = task
+        task.add_done_callback(lambda _: _merges.pop(call_sid, None))
+
+    try:
+        return await asyncio.shield(task)
+    except Exception as e:
+        print(f"❌ Failed merging recording {call_sid}: {e}")
+        return None
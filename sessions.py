@@ -0,0 +1,413 @@
+import os
+import json
+import time
+import uuid
+import random
+import sqlite3
+import asyncio
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+# ==========================================
+# ENV VARIABLES
+# ==========================================
+# One policy everywhere: a call is dropped after SESSION_TTL seconds without a webhook
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "5000"))
+# Only the last 10 messages go into the prompt; keep a little more than that
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "40"))
+
+
+class SessionStore:
+    """
+    In-memory call sessions ordered by last activity.
+
+    The OrderedDict doubles as the expiry index: touching a session moves it
+    to the end, so expired sessions are always at the front and eviction
+    pops them off in amortized O(1). SESSION_MAX_SESSIONS is a hard cap;
+    above it the least recently active call is evicted.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=SESSION_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._last_seen = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    # ---------------- internals ----------------
+    def _touch(self, call_sid, now):
+        self._sessions.move_to_end(call_sid)
+        self._last_seen[call_sid] = now
+
+    def _is_expired(self, call_sid, now):
+        return now - self._last_seen[call_sid] > self.ttl
+
+    def _remove(self, call_sid):
+        self._last_seen.pop(call_sid, None)
+        return self._sessions.pop(call_sid, None)
+
+    # ---------------- dict-style API ----------------
+    def __contains__(self, call_sid):
+        with self._lock:
+            return call_sid in self._sessions and not self._is_expired(call_sid, time.monotonic())
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __getitem__(self, call_sid):
+        session = self.get(call_sid)
+        if session is None:
+            raise KeyError(call_sid)
+        return session
+
+    def __setitem__(self, call_sid, session):
+        now = time.monotonic()
+
+        with self._lock:
+            self._sessions[call_sid] = session
+            self._touch(call_sid, now)
+
+            while len(self._sessions) > self.max_sessions:
+                oldest, _ = self._sessions.popitem(last=False)
+                self._last_seen.pop(oldest, None)
+                self.evicted += 1
+
+    def get(self, call_sid, default=None):
+        """
+        Return the live session and mark it active.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            if call_sid not in self._sessions:
+                self.misses += 1
+                return default
+
+            if self._is_expired(call_sid, now):
+                self._remove(call_sid)
+                self.expired += 1
+                self.misses += 1
+                return default
+
+            self._touch(call_sid, now)
+            self.hits += 1
+            return self._sessions[call_sid]
+
+    def pop(self, call_sid, default=None):
+        with self._lock:
+            session = self._remove(call_sid)
+        return default if session is None else session
+
+    # ---------------- maintenance ----------------
+    def evict_expired(self) -> int:
+        """
+        Drop sessions idle for longer than the TTL, oldest first.
+        """
+        now = time.monotonic()
+        count = 0
+
+        with self._lock:
+            while self._sessions:
+                oldest = next(iter(self._sessions))
+                if not self._is_expired(oldest, now):
+                    break
+                self._remove(oldest)
+                count += 1
+
+            self.expired += count
+
+        return count
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._sessions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+def trim_messages(session: dict):
+    messages = session.get("messages")
+    if messages and len(messages) > SESSION_MAX_MESSAGES:
+        del messages[:-SESSION_MAX_MESSAGES]
+
+
+# ==========================================
+# PLUGGABLE BACKENDS
+# ==========================================
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "./cache/sessions.db")
+# Longer than the slowest turn (LLM deadline + retrieval); a crashed worker's lock frees itself after this
+SESSION_LOCK_LEASE = float(os.getenv("SESSION_LOCK_LEASE", "30"))
+
+
+class _KeyedLocks:
+    """
+    One asyncio.Lock per call, dropped again once nobody holds or waits on it.
+    """
+
+    def __init__(self):
+        self._locks = {}
+
+    @asynccontextmanager
+    async def hold(self, key):
+        lock, users = self._locks.get(key, (asyncio.Lock(), 0))
+        self._locks[key] = (lock, users + 1)
+
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[key]
+            if users <= 1:
+                self._locks.pop(key, None)
+            else:
+                self._locks[key] = (lock, users - 1)
+
+
+class MemorySessionBackend:
+    """
+    Single-process backend: sessions live in a SessionStore and are mutated in place.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or SessionStore()
+        self._locks = _KeyedLocks()
+
+    def lock(self, call_sid):
+        return self._locks.hold(call_sid)
+
+    async def load(self, call_sid):
+        return self.store.get(call_sid)
+
+    async def save(self, call_sid, session):
+        self.store[call_sid] = session
+
+    async def delete(self, call_sid):
+        self.store.pop(call_sid, None)
+
+    async def exists(self, call_sid) -> bool:
+        return call_sid in self.store
+
+    async def evict_expired(self) -> int:
+        return self.store.evict_expired()
+
+    async def stats(self) -> dict:
+        return {"backend": "memory", **self.store.stats()}
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def _decode(obj):
+    if len(obj) == 1 and "$dt" in obj:
+        return datetime.fromisoformat(obj["$dt"])
+    return obj
+
+
+class SqliteSessionBackend:
+    """
+    Cross-process backend in one SQLite file (WAL), so any uvicorn worker can
+    serve any webhook of a call. Per-call locks are leased rows, so /voice,
+    /recording-status and /recording-complete for one call are serialized
+    across workers while different calls run fully in parallel.
+    """
+
+    def __init__(self, path=SESSION_DB_PATH, ttl=SESSION_TTL, max_sessions=SESSION_MAX_SESSIONS):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.owner = uuid.uuid4().hex
+        self._local = threading.local()
+        self._locks = _KeyedLocks()
+        self._ready = False
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    # ---------------- storage ----------------
+    def _db(self):
+        db = getattr(self._local, "db", None)
+
+        if db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+
+        if not self._ready:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "call_sid TEXT PRIMARY KEY, data TEXT NOT NULL, last_seen REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS call_locks ("
+                "call_sid TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._ready = True
+
+        return db
+
+    def _load(self, call_sid):
+        row = self._db().execute(
+            "SELECT data, last_seen FROM sessions WHERE call_sid = ?", (call_sid,)
+        ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        if time.time() - row[1] > self.ttl:
+            self._db().execute("DELETE FROM sessions WHERE call_sid = ?", (call_sid,))
+            self.expired += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json.loads(row[0], object_hook=_decode)
+
+    def _save(self, call_sid, session):
+        self._db().execute(
+            "INSERT OR REPLACE INTO sessions (call_sid, data, last_seen) VALUES (?, ?, ?)",
+            (call_sid, json.dumps(session, default=_encode), time.time()),
+        )
+
+    def _delete(self, call_sid):
+        self._db().execute("DELETE FROM sessions WHERE call_sid = ?", (call_sid,))
+
+    def _evict(self):
+        db = self._db()
+        expired = db.execute(
+            "DELETE FROM sessions WHERE last_seen < ?", (time.time() - self.ttl,)
+        ).rowcount
+        db.execute("DELETE FROM call_locks WHERE expires_at < ?", (time.time(),))
+
+        count = db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        evicted = 0
+        if count > self.max_sessions:
+            evicted = db.execute(
+                "DELETE FROM sessions WHERE call_sid IN "
+                "(SELECT call_sid FROM sessions ORDER BY last_seen LIMIT ?)",
+                (count - self.max_sessions,),
+            ).rowcount
+
+        self.expired += expired
+        self.evicted += evicted
+        return expired + evicted
+
+    def _try_lock(self, call_sid):
+        now = time.time()
+        cursor = self._db().execute(
+            "INSERT INTO call_locks (call_sid, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(call_sid) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE call_locks.expires_at < ?",
+            (call_sid, self.owner, now + SESSION_LOCK_LEASE, now),
+        )
+        return cursor.rowcount == 1
+
+    def _unlock(self, call_sid):
+        self._db().execute(
+            "DELETE FROM call_locks WHERE call_sid = ? AND owner = ?", (call_sid, self.owner)
+        )
+
+    # ---------------- async API ----------------
+    @asynccontextmanager
+    async def lock(self, call_sid):
+        # In-process waiters queue on an asyncio.Lock; only one of them polls SQLite
+        async with self._locks.hold(call_sid):
+            delay = 0.005
+            while not await asyncio.to_thread(self._try_lock, call_sid):
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                delay = min(delay * 2, 0.1)
+
+            try:
+                yield
+            finally:
+                await asyncio.to_thread(self._unlock, call_sid)
+
+    async def load(self, call_sid):
+        return await asyncio.to_thread(self._load, call_sid)
+
+    async def save(self, call_sid, session):
+        await asyncio.to_thread(self._save, call_sid, session)
+
+    async def delete(self, call_sid):
+        await asyncio.to_thread(self._delete, call_sid)
+
+    async def exists(self, call_sid) -> bool:
+        return await self.load(call_sid) is not None
+
+    async def evict_expired(self) -> int:
+        return await asyncio.to_thread(self._evict)
+
+    async def stats(self) -> dict:
+        active = await asyncio.to_thread(
+            lambda: self._db().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        )
+        return {
+            "backend": "sqlite",
+            "active": active,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+def create_session_backend(kind=SESSION_BACKEND):
+    if kind == "sqlite":
+        return SqliteSessionBackend()
+    if kind == "memory":
+        return MemorySessionBackend()
+    raise ValueError(f"Unknown SESSION_BACKEND: {kind}")
+
+
+@asynccontextmanager
+async def session_scope(backend, call_sid, factory=None):
+    """
+    Lock the call, load its session, and save it back on exit (even on error).
+
+    With a factory, a missing session is created and a partial one (e.g.
+    made by a recording callback) gets its missing keys filled in.
+    Yields None when there is no session and no factory.
+    """
+    waited = time.perf_counter()
+
+    async with backend.lock(call_sid):
+        metrics.record_stage("session_lock", time.perf_counter() - waited)
+
+        with metrics.stage("session_load"):
+            session = await backend.load(call_sid)
+
+        if factory is not None:
+            if session is None:
+                session = factory()
+            else:
+                for key, value in factory().items():
+                    session.setdefault(key, value)
+
+        try:
+            yield session
+        finally:
+            if session is not None:
+                with metrics.stage("session_save"):
+                    await backend.save(call_sid, session)
@@ -0,0 +1,280 @@
+import os
+import re
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from dotenv import load_dotenv
+import rag
+import metrics
+from behavior import compile_behavior
+from intents import build_intent_matcher
+
+load_dotenv()
+
+# ==========================================
+# ENV VARIABLES
+# ==========================================
+STORE_ID = os.getenv("STORE_ID")
+STORE_NAME = os.getenv("STORE_NAME")
+TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
+MANAGER_NUMBER = os.getenv("MANAGER_NUMBER")
+
+# JSON list of {"store_id", "name", "numbers", "manager_number"}; unset = the STORE_ID store only
+STORES_FILE = os.getenv("STORES_FILE")
+STORE_MEMORY_BUDGET_MB = float(os.getenv("STORE_MEMORY_BUDGET_MB", "2048"))
+STORE_MAX_LOADED = int(os.getenv("STORE_MAX_LOADED", "50"))
+# How long a call to a cold store waits for its load before hearing "initializing"
+STORE_LOAD_WAIT_SECONDS = float(os.getenv("STORE_LOAD_WAIT_SECONDS", "8"))
+
+BEHAVIOR_STAMP_PATH = "./cache/behavior.stamp"
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_number(number) -> str:
+    return _NON_DIGITS.sub("", number or "")
+
+
+def behavior_stamp_path(store_id) -> str:
+    """
+    Workers poll this to pick up /update-system hits served by a sibling.
+    """
+    if str(store_id) == str(STORE_ID):
+        return BEHAVIOR_STAMP_PATH
+    return os.path.join(rag.STORES_CACHE_PATH, str(store_id), "behavior.stamp")
+
+
+# ==========================================
+# CONFIG
+# ==========================================
+@dataclass(frozen=True)
+class StoreConfig:
+    store_id: str
+    name: str = None
+    numbers: tuple = ()
+    manager_number: str = None
+
+    @property
+    def sms_number(self):
+        return self.numbers[0] if self.numbers else TWILIO_PHONE_NUMBER
+
+
+def load_store_configs(path=STORES_FILE) -> dict:
+    """
+    store_id -> StoreConfig. The .env store is always included; an entry in
+    STORES_FILE with the same store_id overrides it. Every entry needs a
+    name: callers hear it, so it must never default to the .env store's.
+    """
+    configs = {}
+
+    if STORE_ID:
+        configs[str(STORE_ID)] = StoreConfig(
+            store_id=str(STORE_ID),
+            name=STORE_NAME,
+            numbers=(TWILIO_PHONE_NUMBER,) if TWILIO_PHONE_NUMBER else (),
+            manager_number=MANAGER_NUMBER,
+        )
+
+    if path:
+        with open(path, "r") as f:
+            entries = json.load(f)
+
+        for entry in entries:
+            store_id = str(entry["store_id"])
+            if not entry.get("name"):
+                raise ValueError(f"❌ Store {store_id} in {path} has no name")
+
+            configs[store_id] = StoreConfig(
+                store_id=store_id,
+                name=entry["name"],
+                numbers=tuple(entry.get("numbers") or ()),
+                manager_number=entry.get("manager_number"),
+            )
+
+    return configs
+
+
+# ==========================================
+# PER-STORE CONTEXT
+# ==========================================
+class StoreContext:
+    """
+    Everything a turn needs for one store: its behavior snapshot, intent
+    matcher and RAG index. Snapshots are replaced, never mutated, so a turn
+    that grabbed them keeps working after the context is refreshed or evicted.
+    """
+
+    def __init__(self, config: StoreConfig):
+        self.config = config
+        self.store_id = config.store_id
+        self.index = rag.default_index if config.store_id == str(STORE_ID) else rag.StoreIndex(config.store_id)
+        self.behavior = compile_behavior(store_name=config.name)
+        self.intent_matcher = build_intent_matcher()
+
+        self.stamp_path = behavior_stamp_path(config.store_id)
+        self.behavior_stamp = 0.0
+
+        self.rag_lock = asyncio.Lock()
+        self.rag_rebuild_pending = False
+
+    def refresh_intents(self):
+        """
+        Recompile the intent matcher from the current behavior (transfer
+        keywords) and price list (repair names), then swap it in.
+        """
+        self.intent_matcher = build_intent_matcher(
+            self.behavior.data, self.index.get_snapshot().price_index.rows
+        )
+
+    def memory_estimate(self) -> int:
+        return self.index.get_snapshot().memory_estimate()
+
+
+# ==========================================
+# REGISTRY (lazy load + LRU eviction)
+# ==========================================
+class StoreRegistry:
+    """
+    Routes calls to store contexts by the dialed number. Contexts load on
+    first use (one load per store however many calls arrive at once) and
+    the least recently used ones are dropped when the loaded indexes go
+    over STORE_MEMORY_BUDGET_MB or STORE_MAX_LOADED. The default store is
+    loaded at startup and never evicted. A load that fails before the index
+    is in keeps what it did get (the behavior), so the next call only
+    retries the rest.
+    """
+
+    def __init__(self, configs: dict, loader, memory_budget_mb=STORE_MEMORY_BUDGET_MB, max_loaded=STORE_MAX_LOADED):
+        self.configs = configs
+        self.loader = loader
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.max_loaded = max_loaded
+
+        self._by_number = {
+            normalize_number(number): config.store_id
+            for config in configs.values()
+            for number in config.numbers
+            if normalize_number(number)
+        }
+        self._loaded = OrderedDict()
+        self._loading = {}
+        # store_id -> context whose last load failed; holds no index
+        self._partial = {}
+        self.loads = 0
+        self.failures = 0
+        self.evictions = 0
+
+        self.default = None
+        if STORE_ID and str(STORE_ID) in configs:
+            self.default = StoreContext(configs[str(STORE_ID)])
+            self._loaded[self.default.store_id] = self.default
+            metrics.STORES_LOADED.set(len(self._loaded))
+
+    def route(self, to_number: str):
+        """
+        store_id for a dialed number; unknown numbers go to the default store.
+        """
+        store_id = self._by_number.get(normalize_number(to_number))
+        if store_id is None and self.default is not None:
+            store_id = self.default.store_id
+        return store_id
+
+    def peek(self, store_id):
+        return self._loaded.get(store_id)
+
+    def loaded(self) -> list:
+        return list(self._loaded.values())
+
+    async def get(self, store_id, timeout=None):
+        """
+        The loaded context for store_id, loading it if needed. Returns None for
+        unknown stores, failed loads, and loads still running after `timeout`
+        seconds; those keep going in the background.
+        """
+        context = self._loaded.get(store_id)
+        if context is not None:
+            self._loaded.move_to_end(store_id)
+            return context
+
+        config = self.configs.get(store_id)
+        if config is None:
+            return None
+
+        task = self._loading.get(store_id)
+        if task is None:
+            task = asyncio.create_task(self._load(config))
+            self._loading[store_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(store_id, None))
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"⏳ Store {store_id} still loading")
+            return None
+
+    async def _load(self, config: StoreConfig):
+        started = time.perf_counter()
+        context = self._partial.pop(config.store_id, None) or StoreContext(config)
+
+        try:
+            await self.loader(context)
+        except Exception as e:
+            # Not served: the store's next call tries again. Contexts that got
+            # an index anyway are dropped so their memory isn't held off-budget.
+            if context.index.get_snapshot().retriever is None:
+                self._partial[config.store_id] = context
+            self.failures += 1
+            metrics.STORE_LOADS.inc(outcome="error")
+            print(f"❌ Store {config.store_id} failed to load:", e)
+            return None
+
+        self.loads += 1
+        metrics.STORE_LOADS.inc(outcome="ok")
+        metrics.STORE_LOAD_SECONDS.observe(time.perf_counter() - started)
+
+        self._loaded[config.store_id] = context
+        print(f"🏪 Store {config.store_id} loaded in {time.perf_counter() - started:.2f}s")
+
+        self.evict()
+        return context
+
+    def memory_estimate(self) -> int:
+        return sum(context.memory_estimate() for context in self._loaded.values())
+
+    def evict(self):
+        """
+        Drop least recently used contexts until under budget. The default
+        store and stores mid-rebuild stay.
+        """
+        used = self.memory_estimate()
+
+        for store_id, context in list(self._loaded.items()):
+            if used <= self.memory_budget and len(self._loaded) <= self.max_loaded:
+                break
+
+            if context is self.default or context.rag_lock.locked():
+                continue
+
+            used -= context.memory_estimate()
+            del self._loaded[store_id]
+            self.evictions += 1
+            metrics.STORE_EVICTIONS.inc()
+            print(f"🧹 Evicted store {store_id}")
+
+        metrics.STORES_LOADED.set(len(self._loaded))
+        metrics.STORE_MEMORY_BYTES.set(used)
+
+    def stats(self) -> dict:
+        return {
+            "configured": len(self.configs),
+            "loaded": list(self._loaded),
+            "loading": list(self._loading),
+            "partial": list(self._partial),
+            "memory_bytes": self.memory_estimate(),
+            "memory_budget_bytes": self.memory_budget,
+            "loads": self.loads,
+            "failures": self.failures,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,62 @@
+import asyncio
+import json
+import os
+import time
+import websockets
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Local stand-in for Twilio ConversationRelay: sends setup/prompt frames
+# to /stream and prints each streamed sentence with its latency.
+PUBLIC_URL = os.getenv("PUBLIC_URL", "http://localhost:8000")
+URL = PUBLIC_URL.replace("https://", "wss://").replace("http://", "ws://") + "/stream"
+
+CALL_SID = os.getenv("CHECKER_CALL_SID", f"CAfake{int(time.time())}")
+
+
+async def main():
+    async with websockets.connect(URL) as ws:
+
+        await ws.send(json.dumps({
+            "type": "setup",
+            "callSid": CALL_SID,
+            "from": "+15555550100",
+            "to": os.getenv("TWILIO_PHONE_NUMBER", "+15555550199"),
+        }))
+
+        print(f"Connected to {URL} as {CALL_SID}\n")
+
+        while True:
+            text = input("You: ")
+
+            if text.lower() in ["exit", "quit"]:
+                break
+
+            started = time.perf_counter()
+            first = None
+
+            await ws.send(json.dumps({"type": "prompt", "voicePrompt": text, "last": True}))
+
+            while True:
+                message = json.loads(await ws.recv())
+                elapsed = (time.perf_counter() - started) * 1000
+
+                if message.get("type") == "end":
+                    print(f"[{elapsed:7.1f} ms] END {message.get('handoffData')}")
+                    return
+
+                if message.get("token"):
+                    if first is None:
+                        first = elapsed
+                    print(f"[{elapsed:7.1f} ms] {message['token']}")
+
+                if message.get("last"):
+                    break
+
+            print(f"Time to first sentence: {first or 0:.1f} ms")
+            print("-" * 50)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
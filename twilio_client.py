@@ -0,0 +1,114 @@
+import os
+import time
+import asyncio
+from aiohttp import ClientConnectorError
+from aiohttp_retry import ExponentialRetry, RetryClient
+from twilio.rest import Client
+from twilio.http.async_http_client import AsyncTwilioHttpClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ==========================================
+# ENV VARIABLES
+# ==========================================
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+TWILIO_TIMEOUT = float(os.getenv("TWILIO_TIMEOUT", "10"))
+# Only reads/deletes and requests that never reached Twilio are retried
+TWILIO_MAX_RETRIES = int(os.getenv("TWILIO_MAX_RETRIES", "2"))
+# Point at a local stand-in server, e.g. http://127.0.0.1:9001
+TWILIO_API_BASE = os.getenv("TWILIO_API_BASE")
+
+_client = None
+
+# op -> {"count", "errors", "total_ms", "max_ms"}
+LATENCY = {}
+
+# A POST (SMS, recording) that timed out or got a 5xx may already have been
+# accepted; sending it again would duplicate it
+IDEMPOTENT_METHODS = {"GET", "DELETE"}
+
+
+# ==========================================
+# SHARED CLIENT
+# ==========================================
+def get_client() -> Client:
+    """
+    One Twilio client per process on a pooled aiohttp transport. 5xx
+    responses are retried for IDEMPOTENT_METHODS only; failed connects
+    (nothing was sent) are retried for every method.
+    """
+    global _client
+
+    if _client is None:
+        http_client = AsyncTwilioHttpClient(pool_connections=True, timeout=TWILIO_TIMEOUT)
+        http_client.session = RetryClient(
+            client_session=http_client.session,
+            retry_options=ExponentialRetry(
+                attempts=TWILIO_MAX_RETRIES + 1,
+                methods=IDEMPOTENT_METHODS,
+                exceptions={ClientConnectorError},
+            ),
+        )
+        _client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, http_client=http_client)
+
+        if TWILIO_API_BASE:
+            _client.api.base_url = TWILIO_API_BASE.rstrip("/")
+
+    return _client
+
+
+async def close():
+    global _client
+
+    if _client is not None:
+        await _client.http_client.close()
+        _client = None
+
+
+async def _timed(op: str, coro):
+    started = time.perf_counter()
+    stats = LATENCY.setdefault(op, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+
+    try:
+        return await asyncio.wait_for(coro, timeout=TWILIO_TIMEOUT * (TWILIO_MAX_RETRIES + 1))
+    except Exception:
+        stats["errors"] += 1
+        raise
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        stats["count"] += 1
+        stats["total_ms"] += elapsed
+        stats["max_ms"] = max(stats["max_ms"], elapsed)
+
+
+def latency_stats() -> dict:
+    return {
+        op: {
+            "count": stats["count"],
+            "errors": stats["errors"],
+            "avg_ms": round(stats["total_ms"] / stats["count"], 2) if stats["count"] else 0.0,
+            "max_ms": round(stats["max_ms"], 2),
+        }
+        for op, stats in LATENCY.items()
+    }
+
+
+# ==========================================
+# OPERATIONS
+# ==========================================
+async def send_sms(to: str, body: str, from_: str):
+    message = await _timed(
+        "send_sms",
+        get_client().messages.create_async(body=body, from_=from_, to=to),
+    )
+    return message.sid
+
+
+async def start_recording(call_sid: str, **kwargs):
+    recording = await _timed(
+        "start_recording",
+        get_client().calls(call_sid).recordings.create_async(**kwargs),
+    )
+    return recording.sid